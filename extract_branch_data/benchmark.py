@@ -15,7 +15,7 @@ def run_command(cmd):
 def benchmark_script(script_name, binary, args, runs=5):
     times = []
     for i in range(runs):
-        cmd = [script_name, "/dev/null", binary, *args]
+        cmd = [script_name, "--no-cache", "/dev/null", binary, *args]
         duration = run_command(cmd)
         times.append(duration)
         print(f"{script_name} run {i+1}: {duration:.3f} seconds")
@@ -39,7 +39,12 @@ def main():
     binary = sys.argv[1]
     args = sys.argv[2:]
 
-    scripts = ["./branch_data_cpp.py", "./branch_data_py.py", "./branch_data_lldb.py"]
+    scripts = [
+        "./branch_data_cpp.py",
+        "./branch_data_py.py",
+        "./branch_data_lldb.py",
+        "./branch_data_ptrace.py",
+    ]
 
     results = []
 
@@ -1,53 +1,60 @@
 #!/usr/bin/env python3
+import os
+import argparse
 import subprocess
 import sys
-import json
-from lib.parse_branches import parse_branches
-from lib.history import history
+from lib.parse_branches import disassemble
+from lib.cache import open_cache, trace_key, restore_trace, store_trace
+from lib.history import decode
+from lib.records import read_records
+from lib.btrace import write_branch_arrays
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: branch_data_cpp.py <output> <binary> [arguments]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Trace branches with commands.out")
+    parser.add_argument("output")
+    parser.add_argument("binary")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disassemble and trace again even if a cached result exists",
+    )
+    args = parser.parse_args()
+
+    cache = open_cache(args.no_cache)
+    output = args.output
+    binary = args.binary
+    arguments = args.arguments
 
-    output = sys.argv[1]
-    binary = sys.argv[2]
-    arguments = sys.argv[3:]
+    key = trace_key("cpp", binary, arguments, output)
+    if restore_trace(cache, key, output):
+        sys.exit(0)
 
     # Get branch addresses
-    asm = subprocess.check_output(["otool", "-tv", binary], text=True)
-    branches = parse_branches(asm.splitlines())
+    branches = disassemble(binary, cache)
 
-    # Create process for the C++ program
+    # Create process for the C++ program, which writes binary (pc, rflags)
+    # records to a dedicated pipe so the traced program's output can't mix in
+    read_fd, write_fd = os.pipe()
     cpp_process = subprocess.Popen(
-        ["./lib/commands.out", binary, *arguments],
+        ["./lib/commands.out", "--fd", str(write_fd), binary, *arguments],
         stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
+        pass_fds=[write_fd],
         text=True,
     )
+    os.close(write_fd)
 
     # Send addresses to C++ program
-    for address in branches:
-        cpp_process.stdin.write(f"{address}\n")
+    cpp_process.stdin.write("".join(f"{address}\n" for address in branches))
     cpp_process.stdin.close()  # Signal end of input
 
     # Read output from C++ program
-    branch_trace = []
-    for line in cpp_process.stdout:
-        # Assuming output format is "0xADDRESS,FLAGS"
-        pc, rflags = line.strip().split(",")
-        branch_trace.append({pc: int(rflags)})
+    with os.fdopen(read_fd, "rb") as f:
+        records = read_records(f)
 
     # Wait for C++ program to finish
     cpp_process.wait()
 
-    branch_history = history(branch_trace, branches)
-
-    branch_data = {
-        "binary": binary,
-        "arguments": arguments,
-        "branch_history": branch_history,
-    }
-
-    with open(output, "w") as f:
-        json.dump(branch_data, f, indent=2)
+    pcs, taken = decode(records["pc"], records["rflags"], branches)
+    write_branch_arrays(output, binary, arguments, pcs, taken)
+    store_trace(cache, key, output)
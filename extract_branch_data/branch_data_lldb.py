@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
+import argparse
 import subprocess
 import sys
-import json
-from lib.parse_branches import parse_branches
-from lib.trace import trace
-from lib.history import history
+from lib.parse_branches import disassemble
+from lib.cache import open_cache, trace_key, restore_trace, store_trace
+from lib.trace import stream_trace
+from lib.history import BranchIndex, decode
+from lib.btrace import TraceWriter
 
 
 def generate_commands_lldb(binary, arguments, branches):
@@ -25,35 +27,53 @@ def generate_commands_lldb(binary, arguments, branches):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: branch_data_lldb.py <output> <binary> [arguments]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Trace branches with lldb")
+    parser.add_argument("output")
+    parser.add_argument("binary")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+    parser.add_argument(
+        "--test-keys",
+        action="store_true",
+        help="Only trace the two test branches of a local build of tree",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disassemble and trace again even if a cached result exists",
+    )
+    args = parser.parse_args()
+    # our flags are honoured after the binary too
+    for flag in ("--test-keys", "--no-cache"):
+        if flag in args.arguments:
+            args.arguments = [arg for arg in args.arguments if arg != flag]
+            setattr(args, flag[2:].replace("-", "_"), True)
 
-    output = sys.argv[1]
-    binary = sys.argv[2]
-    arguments = " ".join(sys.argv[3:])
+    cache = open_cache(args.no_cache)
+    output = args.output
+    binary = args.binary
+    arguments = " ".join(args.arguments)
 
-    asm = subprocess.check_output(["otool", "-tv", binary], text=True)
+    key = trace_key("lldb", binary, arguments, output)
+    if restore_trace(cache, key, output):
+        sys.exit(0)
 
-    branches = parse_branches(asm.splitlines())
+    branches = disassemble(binary, cache)
 
     # test branches in my copy of "/usr/local/bin/tree"
-    if "--test-keys" in sys.argv:
+    if args.test_keys:
         test_keys = set(["0x100007f09", "0x100006685"])
         branches = {k: v for k, v in branches.items() if k in test_keys}
 
     generate_commands_lldb(binary, arguments, branches)
 
-    log = subprocess.check_output(["lldb", "-b", "-s", "lib/commands.lldb"], text=True)
-
-    branch_trace = trace(log.splitlines())
-
-    branch_history = history(branch_trace, branches)
-    branch_data = {
-        "binary": binary,
-        "arguments": arguments,
-        "branch_history": branch_history,
-    }
-
-    with open(output, "w") as f:
-        json.dump(branch_data, f, indent=2)
+    # decode and write records while lldb is still running
+    lldb = subprocess.Popen(
+        ["lldb", "-b", "-s", "lib/commands.lldb"], stdout=subprocess.PIPE, text=True
+    )
+    index = BranchIndex(branches)
+    with TraceWriter(output, binary, arguments) as writer:
+        for pcs, rflags in stream_trace(lldb.stdout):
+            writer.write(*decode(pcs, rflags, index))
+    if lldb.wait():
+        raise subprocess.CalledProcessError(lldb.returncode, lldb.args)
+    store_trace(cache, key, output)
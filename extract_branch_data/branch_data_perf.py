@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+from lib.parse_branches import disassemble
+from lib.cache import open_cache
+from lib.perf import LBRDecoder
+from lib.btrace import TraceWriter
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import perf script LBR branch stacks as a branch trace"
+    )
+    parser.add_argument("output")
+    parser.add_argument("binary")
+    parser.add_argument(
+        "perf_script", help="perf script -F ip,brstack output (.gz/.xz too)"
+    )
+    parser.add_argument(
+        "--bias",
+        type=lambda text: int(text, 0),
+        help="Load bias of the binary if the dump has no mmap events",
+    )
+    parser.add_argument(
+        "--per-pc",
+        type=int,
+        default=20,
+        metavar="N",
+        help="List the N branches the hardware mispredicted most (default: 20)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disassemble again even if a cached branch set exists",
+    )
+    args = parser.parse_args()
+
+    cache = open_cache(args.no_cache)
+
+    branches = disassemble(args.binary, cache)
+    decoder = LBRDecoder(args.binary, branches, args.bias)
+
+    with TraceWriter(args.output, args.binary, "") as writer:
+        for pcs, taken in decoder.decode_file(args.perf_script):
+            writer.write(pcs, taken)
+        writer.metadata.update(decoder.metadata(args.perf_script))
+
+    hardware = decoder.hardware
+    executions = int(hardware.executions.sum())
+    missed = int(hardware.mispredictions.sum())
+    print(
+        f"{decoder.samples:,} samples, {decoder.entries:,} LBR entries, "
+        f"{decoder.skipped:,} gaps skipped",
+        file=sys.stderr,
+    )
+    if executions:
+        print(
+            f"Hardware: {missed:,} of {executions:,} recorded taken conditional "
+            f"branches mispredicted ({1 - missed / executions:.4f} accuracy)"
+        )
+        if args.per_pc:
+            hardware.report("hardware", args.per_pc, branches)
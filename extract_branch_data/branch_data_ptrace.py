@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+from lib.parse_branches import disassemble
+from lib.cache import open_cache, trace_key, restore_trace, store_trace
+from lib.cache import restore_module_trace, store_module_trace
+from lib.ptrace import trace_branches, trace_process, coverage
+from lib.sampling import Sampler
+from lib.history import history
+from lib.btrace import write_branch_data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trace branches with ptrace")
+    parser.add_argument("output")
+    parser.add_argument("binary")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+    parser.add_argument(
+        "--coverage",
+        action="store_true",
+        help="Only trace branches that a one-shot coverage run executed",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        help="Hits recorded per branch before it is disarmed for the window",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between re-arming exhausted branches (default: 1.0)",
+    )
+    parser.add_argument(
+        "--shlibs",
+        action="store_true",
+        help="Also trace shared libraries loaded before the entry point",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disassemble and trace again even if a cached result exists",
+    )
+    args = parser.parse_args()
+
+    cache = open_cache(args.no_cache)
+    key = trace_key(
+        "ptrace",
+        args.binary,
+        args.arguments,
+        args.output,
+        coverage=args.coverage,
+        budget=args.budget,
+        interval=args.interval,
+        shlibs=args.shlibs,
+    )
+    restore = restore_module_trace if args.shlibs else restore_trace
+    if restore(cache, key, args.output):
+        sys.exit(0)
+
+    sampler = Sampler(args.budget, args.interval) if args.budget else None
+    metadata = {}
+    if args.shlibs:
+        branches = None
+        if args.coverage:
+            found, _, executed = trace_process(
+                args.binary, args.arguments, one_shot=True, cache=cache
+            )
+            branches = {pc: found[pc] for entry in executed for pc in entry}
+            print(
+                f"Coverage: {len(branches)}/{len(found)} branches executed",
+                file=sys.stderr,
+            )
+        branches, modules, branch_trace = trace_process(
+            args.binary, args.arguments, sampler, cache=cache, branches=branches
+        )
+        metadata["modules"] = [module._asdict() for module in modules]
+    else:
+        branches = disassemble(args.binary, cache)
+
+        if args.coverage:
+            executed = coverage(args.binary, args.arguments, branches)
+            print(
+                f"Coverage: {len(executed)}/{len(branches)} branches executed",
+                file=sys.stderr,
+            )
+            branches = executed
+
+        branch_trace = trace_branches(args.binary, args.arguments, branches, sampler)
+
+    branch_history = history(branch_trace, branches)
+    if sampler:
+        metadata.update(sampler.metadata())
+    write_branch_data(
+        args.output, args.binary, " ".join(args.arguments), branch_history, **metadata
+    )
+    if args.shlibs:
+        paths = sorted({module.path for module in modules})
+        store_module_trace(cache, key, args.output, paths)
+    else:
+        store_trace(cache, key, args.output)
@@ -1,36 +1,94 @@
 #!/usr/bin/env python3
+import os
+import json
+import argparse
+import tempfile
 import subprocess
 import sys
-import json
-from lib.parse_branches import parse_branches
-from lib.history import history
+from lib.parse_branches import disassemble
+from lib.cache import open_cache, trace_key, restore_trace, store_trace
+from lib.history import decode
+from lib.records import read_records
+from lib.btrace import write_branch_arrays
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: branch_data_py.py <output> <binary> [arguments]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Trace branches with lldb")
+    parser.add_argument("output")
+    parser.add_argument("binary")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+    parser.add_argument(
+        "--coverage",
+        action="store_true",
+        help="Only trace branches that a one-shot coverage run executed",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        help="Hits recorded per branch before it is disabled for the window",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds before exhausted branches are re-enabled (default: 1.0)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disassemble and trace again even if a cached result exists",
+    )
+    args = parser.parse_args()
 
-    output = sys.argv[1]
-    binary = sys.argv[2]
-    arguments = " ".join(sys.argv[3:])
+    cache = open_cache(args.no_cache)
 
-    asm = subprocess.check_output(["otool", "-tv", binary], text=True)
-    branches = parse_branches(asm.splitlines())
+    output = args.output
+    binary = args.binary
+    arguments = " ".join(args.arguments)
 
+    key = trace_key(
+        "py",
+        binary,
+        arguments,
+        output,
+        coverage=args.coverage,
+        budget=args.budget,
+        interval=args.interval,
+    )
+    if restore_trace(cache, key, output):
+        sys.exit(0)
+
+    branches = disassemble(binary, cache)
+
+    # lldb writes the sampler's windows here when sampling
+    meta_fd, meta_path = tempfile.mkstemp(suffix=".json")
+    os.close(meta_fd)
+
+    read_fd, write_fd = os.pipe()
+    options = (
+        f"coverage={args.coverage}, budget={args.budget}, "
+        f"interval={args.interval}, metadata='{meta_path}'"
+    )
     cmd = (
         'lldb -b -Q -o "script import lib.commands; '
-        + f"lib.commands.run_analysis('{binary}', '{arguments}', '{output}')\""
+        + f"lib.commands.run_analysis('{binary}', '{arguments}', '{output}', fd={write_fd}, cache={cache is not None}, {options})\""
     )
 
-    branch_trace = subprocess.check_output(cmd, shell=True, text=True)
-    branch_trace = json.loads(branch_trace)
+    # lldb streams binary (pc, rflags) records back over a pipe
+    lldb = subprocess.Popen(
+        cmd, shell=True, pass_fds=[write_fd], stdout=subprocess.DEVNULL
+    )
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as f:
+        records = read_records(f)
+    if lldb.wait():
+        raise subprocess.CalledProcessError(lldb.returncode, cmd)
 
-    branch_history = history(branch_trace, branches)
-    branch_data = {
-        "binary": binary,
-        "arguments": arguments,
-        "branch_history": branch_history,
-    }
+    metadata = {}
+    if args.budget:
+        with open(meta_path) as f:
+            metadata = json.load(f)
+    os.remove(meta_path)
 
-    with open(output, "w") as f:
-        json.dump(branch_data, f, indent=2)
+    pcs, taken = decode(records["pc"], records["rflags"], branches)
+    write_branch_arrays(output, binary, arguments, pcs, taken, **metadata)
+    store_trace(cache, key, output)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from lib.predictors import COUNTERS, global_history
+from lib.sketch import TopK, mix64, pair_keys
+
+# outcome classes for each simulated branch
+CORRECT, COLD, DESTRUCTIVE, CAPACITY, INHERENT, CONSTRUCTIVE = range(6)
+CLASSES = ["correct", "cold", "destructive", "capacity", "inherent", "constructive"]
+
+
+class AliasAnalyzer:
+    """Classify a hashed table's mispredictions against an interference-free one.
+
+    The reference predictor keys its counters on the full (pc, history) pair in
+    a 2**ideal_bits table, so it almost never aliases. A misprediction is
+      cold         on the first use of the table entry
+      destructive  when the reference was right and another PC last used the entry
+      capacity     when the reference was right and the same PC last used it
+      inherent     when the reference mispredicted too
+    and a correct prediction the reference got wrong is constructive aliasing.
+    """
+
+    def __init__(self, hash, size, method="2bit", ideal_bits=22, top=10):
+        self.hash = hash
+        self.size = size
+        self.bitmask = (1 << size) - 1
+        self.ideal_mask = np.uint64((1 << ideal_bits) - 1)
+
+        self.max_state, initial = COUNTERS[method]
+        self.table = bytearray([initial]) * (1 << size)
+        self.ideal = bytearray([initial]) * (1 << ideal_bits)
+        self.owners = [0] * (1 << size)
+        self.touched = bytearray(1 << size)
+        self.history = 0
+
+        self.classes = np.zeros(len(CLASSES), dtype=np.int64)
+        self.accesses = np.zeros(1 << size, dtype=np.int64)
+        self.mispredictions = np.zeros(1 << size, dtype=np.int64)
+        self.interference = np.zeros(1 << size, dtype=np.int64)
+        self.switches = np.zeros(1 << size, dtype=np.int64)
+        self.pairs = TopK(top)
+        self.top_n = top
+
+    def process(self, pcs, taken):
+        history = global_history(taken, self.size, self.history)
+        index = self.hash(pcs & np.uint64(self.bitmask), history)
+        ideal_index = mix64(pair_keys(pcs, history)) & self.ideal_mask
+
+        # per-branch classification is sequential, everything else is batched
+        threshold = self.max_state // 2
+        top = self.max_state
+        table, ideal, owners, touched = (
+            self.table,
+            self.ideal,
+            self.owners,
+            self.touched,
+        )
+        classes = bytearray(len(taken))
+        switched = bytearray(len(taken))
+        aggressors = [0] * len(taken)
+        rows = zip(index.tolist(), ideal_index.tolist(), pcs.tolist(), taken.tolist())
+        for i, (key, ideal_key, pc, bit) in enumerate(rows):
+            state, ideal_state = table[key], ideal[ideal_key]
+            hit = (state > threshold) == bit
+            ideal_hit = (ideal_state > threshold) == bit
+            owner = owners[key] if touched[key] else pc
+            switched[i] = owner != pc
+
+            if hit:
+                if owner != pc and not ideal_hit:
+                    classes[i] = CONSTRUCTIVE
+                    aggressors[i] = owner
+            elif not touched[key]:
+                classes[i] = COLD
+            elif not ideal_hit:
+                classes[i] = INHERENT
+            elif owner != pc:
+                classes[i] = DESTRUCTIVE
+                aggressors[i] = owner
+            else:
+                classes[i] = CAPACITY
+
+            owners[key] = pc
+            touched[key] = 1
+            if bit:
+                table[key] = min(top, state + 1)
+                ideal[ideal_key] = min(top, ideal_state + 1)
+            else:
+                table[key] = max(0, state - 1)
+                ideal[ideal_key] = max(0, ideal_state - 1)
+
+        if len(taken):
+            self.history = (int(history[-1]) << 1 | int(taken[-1])) & self.bitmask
+
+        classes = np.frombuffer(classes, dtype=np.uint8)
+        entries = index.astype(np.intp)
+        missed = (classes != CORRECT) & (classes != CONSTRUCTIVE)
+        self.classes += np.bincount(classes, minlength=len(CLASSES))
+        self.accesses += np.bincount(entries, minlength=len(self.accesses))
+        self.mispredictions += np.bincount(
+            entries[missed], minlength=len(self.accesses)
+        )
+        switches = np.frombuffer(switched, dtype=np.uint8).astype(bool)
+        self.switches += np.bincount(entries[switches], minlength=len(self.accesses))
+
+        destructive = np.flatnonzero(classes == DESTRUCTIVE)
+        self.interference += np.bincount(
+            entries[destructive], minlength=len(self.accesses)
+        )
+        victims = pcs[destructive]
+        attackers = np.array(aggressors, dtype=np.uint64)[destructive]
+        labels = list(zip(victims.tolist(), attackers.tolist()))
+        self.pairs.add(pair_keys(victims, attackers), labels)
+
+    def report(self, name):
+        total = int(self.classes.sum())
+        missed = total - int(self.classes[CORRECT] + self.classes[CONSTRUCTIVE])
+        used = int(np.count_nonzero(self.accesses))
+
+        print(f"{name} aliasing ({self.size} bits):")
+        print(f"  mispredictions: {missed:,} of {total:,} branches")
+        for cls in (COLD, DESTRUCTIVE, CAPACITY, INHERENT):
+            share = self.classes[cls] / missed if missed else 0
+            print(f"    {CLASSES[cls]:<12} {self.classes[cls]:>12,} ({share:.1%})")
+        print(f"  constructive aliasing hits: {self.classes[CONSTRUCTIVE]:,}")
+        print(f"  entries used: {used}/{len(self.accesses)}")
+
+        print("  entries with the most destructive aliasing:")
+        for entry in np.argsort(-self.interference)[: self.top_n]:
+            if not self.interference[entry]:
+                break
+            print(
+                f"    {entry:#x}: {self.accesses[entry]:,} accesses, "
+                f"{self.switches[entry]:,} PC switches, "
+                f"{self.mispredictions[entry]:,} mispredicted, "
+                f"{self.interference[entry]:,} destructive"
+            )
+
+        error = self.pairs.sketch.error_bound()
+        print(
+            f"  top interfering PC pairs (victim <- aggressor, overcount <= {error:.0f}):"
+        )
+        for (victim, aggressor), count in self.pairs.top():
+            print(f"    {victim:#x} <- {aggressor:#x}: {count:,}")
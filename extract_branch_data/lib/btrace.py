@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Compact binary container for branch_history traces.
+
+Layout (little endian):
+
+    header   magic, version, metadata length, records, PCs, index length
+    metadata JSON object (binary, arguments, ...), padded to 8 bytes
+    pcs      dictionary of distinct branch addresses (uint64)
+    index    zigzag delta + LEB128 varint encoded PC dictionary indices
+    taken    packed taken bitstream (np.packbits order)
+"""
+
+import sys
+import json
+import mmap
+import struct
+import numpy as np
+
+MAGIC = b"GSHTRACE"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+
+
+def is_btrace(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def encode_varints(values):
+    """LEB128 encode an array of unsigned integers"""
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+
+    starts = np.cumsum(nbytes) - nbytes
+    position = np.arange(nbytes.sum()) - np.repeat(starts, nbytes)
+    repeated = np.repeat(values, nbytes)
+
+    out = (repeated >> (7 * position).astype(np.uint64)) & np.uint64(0x7F)
+    out[position < np.repeat(nbytes - 1, nbytes)] |= np.uint64(0x80)
+    return out.astype(np.uint8)
+
+
+def decode_varints(buf):
+    """Decode a complete LEB128 byte stream into uint64 values"""
+    if len(buf) == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    ends = np.flatnonzero((buf & 0x80) == 0)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = ((np.arange(len(buf)) - starts[group]) * 7).astype(np.uint64)
+    parts = (buf & 0x7F).astype(np.uint64) << shift
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def zigzag(deltas):
+    deltas = deltas.astype(np.int64)
+    return ((deltas << 1) ^ (deltas >> 63)).astype(np.uint64)
+
+
+def unzigzag(values):
+    half = (values >> np.uint64(1)).astype(np.int64)
+    sign = (values & np.uint64(1)).astype(np.int64)
+    return half ^ -sign
+
+
+def to_arrays(branch_history):
+    """Pack a branch_history list into uint64 PC and uint8 outcome arrays"""
+    n = len(branch_history)
+    pcs = np.fromiter(
+        (int(addr, 16) for inst in branch_history for addr in inst),
+        dtype=np.uint64,
+        count=n,
+    )
+    taken = np.fromiter(
+        (t for inst in branch_history for t in inst.values()), dtype=np.uint8, count=n
+    )
+    return pcs, taken
+
+
+def write(path, pcs, taken, **metadata):
+    """Write PC/outcome arrays and metadata (binary, arguments, ...) to path"""
+    pcs = np.asarray(pcs, dtype=np.uint64)
+    taken = np.asarray(taken, dtype=np.uint8)
+
+    table, index = np.unique(pcs, return_inverse=True)
+    index = index.reshape(-1).astype(np.int64)
+    encoded = encode_varints(zigzag(np.diff(index, prepend=0)))
+
+    meta = json.dumps(metadata).encode()
+    meta += b" " * (-(HEADER.size + len(meta)) % 8)
+
+    with open(path, "wb") as f:
+        f.write(
+            HEADER.pack(MAGIC, VERSION, len(meta), len(pcs), len(table), len(encoded))
+        )
+        f.write(meta)
+        f.write(table.astype("<u8").tobytes())
+        f.write(encoded.tobytes())
+        f.write(np.packbits(taken != 0).tobytes())
+
+
+class BranchTrace:
+    """mmap-backed reader exposing zero-copy NumPy views of a btrace file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, meta_len, records, n_pcs, index_len = HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a btrace file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported btrace version {version} in {path}")
+
+        offset = HEADER.size
+        self.metadata = json.loads(self._mmap[offset : offset + meta_len])
+        offset += meta_len
+
+        self.records = records
+        self.pcs = np.frombuffer(self._mmap, dtype="<u8", count=n_pcs, offset=offset)
+        offset += 8 * n_pcs
+        self.index_bytes = np.frombuffer(
+            self._mmap, dtype=np.uint8, count=index_len, offset=offset
+        )
+        offset += index_len
+        self.taken_bits = np.frombuffer(
+            self._mmap, dtype=np.uint8, count=(records + 7) // 8, offset=offset
+        )
+
+    def __len__(self):
+        return self.records
+
+    @property
+    def binary(self):
+        return self.metadata.get("binary", "")
+
+    @property
+    def arguments(self):
+        return self.metadata.get("arguments", "")
+
+    def pc_index(self):
+        return np.cumsum(unzigzag(decode_varints(self.index_bytes)))
+
+    def addresses(self):
+        return self.pcs[self.pc_index()]
+
+    def taken(self):
+        return np.unpackbits(self.taken_bits, count=self.records)
+
+    def branch_history(self):
+        """Expand into the legacy list-of-single-key-dicts layout"""
+        return [
+            {hex(pc): taken}
+            for pc, taken in zip(self.addresses().tolist(), self.taken().tolist())
+        ]
+
+
+def write_branch_data(output, binary, arguments, branch_history, **metadata):
+    """Write a trace as btrace if output ends in .btrace, else as JSON"""
+    if output.endswith(".btrace"):
+        pcs, taken = to_arrays(branch_history)
+        write(output, pcs, taken, binary=binary, arguments=arguments, **metadata)
+        return
+
+    # metadata goes first so streaming readers see it before the records
+    branch_data = {
+        "binary": binary,
+        "arguments": arguments,
+        **metadata,
+        "branch_history": branch_history,
+    }
+
+    with open(output, "w") as f:
+        json.dump(branch_data, f, indent=2)
+
+
+def write_branch_arrays(output, binary, arguments, pcs, taken, **metadata):
+    """write_branch_data for (pcs, taken) arrays"""
+    if output.endswith(".btrace"):
+        write(output, pcs, taken, binary=binary, arguments=arguments, **metadata)
+        return
+
+    branch_history = [
+        {hex(pc): t}
+        for pc, t in zip(np.asarray(pcs).tolist(), np.asarray(taken).tolist())
+    ]
+    write_branch_data(output, binary, arguments, branch_history, **metadata)
+
+
+class TraceWriter:
+    """Incremental write_branch_arrays: JSON records are written as each
+    batch arrives, btrace batches are packed compactly until close().
+    Metadata added while writing goes after a JSON branch_history."""
+
+    def __init__(self, output, binary, arguments, **metadata):
+        self.output = output
+        self.metadata = dict(binary=binary, arguments=arguments, **metadata)
+        self.pcs, self.taken = [], []
+        self.file = None
+        self.first = True
+        self.header = set(self.metadata)
+        if not output.endswith(".btrace"):
+            self.file = open(output, "w")
+            header = json.dumps(self.metadata, indent=2)[:-2]
+            self.file.write(f'{header},\n  "branch_history": [')
+
+    def write(self, pcs, taken):
+        if self.file is None:
+            self.pcs.append(np.asarray(pcs, dtype=np.uint64))
+            self.taken.append(np.asarray(taken, dtype=np.uint8))
+            return
+
+        records = ",\n".join(
+            f'    {{"{hex(pc)}": {t}}}'
+            for pc, t in zip(np.asarray(pcs).tolist(), np.asarray(taken).tolist())
+        )
+        if records:
+            self.file.write(("\n" if self.first else ",\n") + records)
+            self.first = False
+        self.file.flush()
+
+    def close(self):
+        if self.file is None:
+            pcs = np.concatenate([np.zeros(0, np.uint64), *self.pcs])
+            taken = np.concatenate([np.zeros(0, np.uint8), *self.taken])
+            write(self.output, pcs, taken, **self.metadata)
+        else:
+            self.file.write("\n  ]")
+            for key, value in self.metadata.items():
+                if key not in self.header:
+                    self.file.write(f",\n  {json.dumps(key)}: {json.dumps(value)}")
+            self.file.write("\n}\n")
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert(json_path, output):
+    # lib.stream builds on this module
+    from lib.stream import read_arrays
+
+    metadata, pcs, taken = read_arrays(json_path)
+    write(output, pcs, taken, **metadata)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m lib.btrace <branch_data.json> <output.btrace>")
+        sys.exit(1)
+
+    convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Content-addressed on-disk cache for branch sets, finished traces and
+the intermediate analyses behind viz.py's figures.
+
+Entries live under $GSHARE_CACHE (default ~/.cache/gshare), keyed by a hash
+of the binary's (or trace's) contents plus whatever else determines the
+result. Reads refresh an entry's mtime and writes evict the least recently
+used entries once the cache grows past $GSHARE_CACHE_SIZE bytes (default
+1 GiB).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+CACHE_DIR = os.path.expanduser(os.environ.get("GSHARE_CACHE", "~/.cache/gshare"))
+CACHE_SIZE = int(os.environ.get("GSHARE_CACHE_SIZE", 1 << 30))
+
+# bump when cached formats or branch extraction change
+VERSION = 1
+
+# variables that can change what a traced program does; the rest of the
+# environment, like per-run CI variables, is left out of trace keys.
+# $GSHARE_TRACE_ENV adds more, comma separated
+TRACE_ENV = {
+    "PATH",
+    "HOME",
+    "LANG",
+    "LC_ALL",
+    "LC_CTYPE",
+    "TZ",
+    "LD_LIBRARY_PATH",
+    "LD_PRELOAD",
+    "LD_BIND_NOW",
+    "DYLD_LIBRARY_PATH",
+    "DYLD_FRAMEWORK_PATH",
+    "DYLD_INSERT_LIBRARIES",
+    "MALLOC_PERTURB_",
+    "PYTHONPATH",
+    "PYTHONHASHSEED",
+    *filter(None, os.environ.get("GSHARE_TRACE_ENV", "").split(",")),
+}
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """Stable hash of JSON-serializable key parts"""
+    text = json.dumps([VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def tool_version(name):
+    """Identify an external tool by the size and mtime of its executable"""
+    path = shutil.which(name)
+    if path is None:
+        return None
+    stat = os.stat(os.path.realpath(path))
+    return [name, stat.st_size, stat.st_mtime_ns]
+
+
+class Cache:
+    def __init__(self, root=CACHE_DIR, max_size=CACHE_SIZE):
+        self.root = root
+        self.max_size = max_size
+
+    def path(self, kind, key):
+        return os.path.join(self.root, kind, key[:2], key)
+
+    def get(self, kind, key):
+        """Path of a cached entry, or None on a miss"""
+        path = self.path(kind, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, kind, key, source):
+        """Copy the file at source into the cache"""
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f, open(source, "rb") as src:
+            shutil.copyfileobj(src, f)
+        os.replace(tmp, path)
+        self.evict()
+
+    def load_json(self, kind, key):
+        path = self.get(kind, key)
+        if path is None:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put_json(self, kind, key, value):
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+        self.evict()
+
+    def load_arrays(self, kind, key):
+        """Dict of the NumPy arrays stored by put_arrays, or None"""
+        path = self.get(kind, key)
+        if path is None:
+            return None
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    def put_arrays(self, kind, key, arrays):
+        path = self.path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime_ns, stat.st_size, path
+
+    def evict(self):
+        """Remove least recently used entries until under max_size"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def open_cache(disabled=False):
+    """The shared cache, or None for a script's --no-cache"""
+    return None if disabled else Cache()
+
+
+def trace_key(backend, binary, arguments, output, **options):
+    """Key for a finished trace of binary run with arguments in this
+    directory and TRACE_ENV environment, written in output's format"""
+    environment = {k: v for k, v in os.environ.items() if k in TRACE_ENV}
+    return make_key(
+        "trace",
+        backend,
+        file_hash(binary),
+        arguments,
+        os.getcwd(),
+        environment,
+        os.path.splitext(output)[1],
+        options,
+    )
+
+
+def restore_trace(cache, key, output):
+    """Copy a cached trace to output, returning whether there was one"""
+    if cache is None:
+        return False
+    path = cache.get("traces", key)
+    if path is None:
+        return False
+    shutil.copyfile(path, output)
+    return True
+
+
+def store_trace(cache, key, output):
+    if cache is not None and os.path.isfile(output):
+        cache.put("traces", key, output)
+
+
+def with_modules(key, paths):
+    """A trace key extended with the content hash of each mapped module"""
+    return make_key(key, [[path, file_hash(path)] for path in paths])
+
+
+def restore_module_trace(cache, key, output):
+    """restore_trace for a trace of shared libraries too: the modules the
+    last stored trace mapped are hashed again, so a changed library misses"""
+    if cache is None:
+        return False
+    paths = cache.load_json("modules", key)
+    if paths is None:
+        return False
+    try:
+        key = with_modules(key, paths)
+    except FileNotFoundError:
+        return False
+    return restore_trace(cache, key, output)
+
+
+def store_module_trace(cache, key, output, paths):
+    if cache is not None and os.path.isfile(output):
+        cache.put_json("modules", key, paths)
+        store_trace(cache, with_modules(key, paths), output)
@@ -3,6 +3,50 @@
 #include <string>
 #include <iostream>
 #include <filesystem>
+#include <cstdint>
+#include <unistd.h>
+
+// Binary trace record, read in Python as np.dtype([("pc", "<u8"), ("rflags", "<u8")])
+struct Record {
+    uint64_t pc;
+    uint64_t rflags;
+};
+
+class RecordWriter {
+    int fd;
+    std::vector<Record> buffer;
+
+public:
+    explicit RecordWriter(int fd) : fd(fd) {
+        buffer.reserve(4096);
+    }
+
+    ~RecordWriter() {
+        flush();
+    }
+
+    void write(uint64_t pc, uint64_t rflags) {
+        buffer.push_back({pc, rflags});
+        if (buffer.size() == buffer.capacity()) {
+            flush();
+        }
+    }
+
+    void flush() {
+        auto data = reinterpret_cast<const char*>(buffer.data());
+        size_t remaining = buffer.size() * sizeof(Record);
+        while (remaining > 0) {
+            ssize_t written = ::write(fd, data, remaining);
+            if (written < 0) {
+                std::cerr << "Failed to write trace records\n";
+                exit(1);
+            }
+            data += written;
+            remaining -= written;
+        }
+        buffer.clear();
+    }
+};
 
 class BranchTracer {
     lldb::SBDebugger debugger;
@@ -30,7 +74,8 @@ public:
 
     void setBreakpoints(
         const std::vector<uint64_t>& addresses,
-        const std::vector<char*>& args
+        const std::vector<char*>& args,
+        RecordWriter& writer
     ) {
         target.BreakpointCreateByName("main");
 
@@ -57,9 +102,7 @@ public:
             uint64_t pc = frame.GetPC();
             uint64_t rflags = frame.FindRegister("rflags").GetValueAsUnsigned();
 
-            // Simple CSV output: pc,rflags
-            std::cout << std::hex << "0x" << pc << ","
-                << rflags << "\n";
+            writer.write(pc, rflags);
 
             process.Continue();
         }
@@ -67,13 +110,21 @@ public:
 };
 
 int main(int argc, char* argv[]) {
-    if (argc < 2) {
-        std::cerr << "Usage: " << argv[0] << " <binary> <arguments>\n";
+    // records go to stdout unless --fd names another descriptor
+    int fd = STDOUT_FILENO;
+    int first = 1;
+    if (argc > 2 && std::string(argv[1]) == "--fd") {
+        fd = std::stoi(argv[2]);
+        first = 3;
+    }
+
+    if (argc < first + 1) {
+        std::cerr << "Usage: " << argv[0] << " [--fd N] <binary> <arguments>\n";
         return 1;
     }
 
     std::vector<char*> args;
-        for (int i = 2; i < argc; i++) {
+        for (int i = first + 1; i < argc; i++) {
             args.push_back(argv[i]);
     }
 
@@ -85,9 +136,10 @@ int main(int argc, char* argv[]) {
         addresses.push_back(addr);
     }
 
+    RecordWriter writer(fd);
     BranchTracer tracer;
-    tracer.createTarget(argv[1]);
-    tracer.setBreakpoints(addresses, args);
+    tracer.createTarget(argv[first]);
+    tracer.setBreakpoints(addresses, args, writer);
 
     return 0;
 }
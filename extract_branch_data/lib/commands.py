@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
 import lldb
 import json
-import subprocess
 import sys
-from lib.parse_branches import parse_branches
-
-
-def run_with_breakpoints(binary, arguments, branches):
+from lib.parse_branches import disassemble
+from lib.cache import Cache
+from lib.records import RecordWriter
+from lib.sampling import Sampler
+
+
+def run_with_breakpoints(
+    binary, arguments, branches, sampler=None, one_shot=False, writer=None
+):
+    """Trace branches, optionally with one-shot breakpoints (coverage) or
+    per-PC budgets from a lib.sampling.Sampler. With a RecordWriter the
+    hits are streamed out as binary records instead of returned.
+
+    In synchronous mode lldb only returns control on a stop, so exhausted
+    breakpoints are re-enabled at the first hit after the interval elapses.
+    """
     # Initialize debugger
     debugger = lldb.SBDebugger.Create()
     debugger.SetAsync(False)
@@ -26,14 +37,16 @@ def run_with_breakpoints(binary, arguments, branches):
 
     # Wait until we hit main
     thread = process.GetSelectedThread()
+    breakpoints = {}
     if thread.GetStopReason() == lldb.eStopReasonBreakpoint:
         # Now set all the address breakpoints
-        breakpoints = []
         for pc in branches:
             bp = target.BreakpointCreateByAddress(int(pc, 16))
-            breakpoints.append(bp)
+            bp.SetOneShot(one_shot)
+            breakpoints[int(pc, 16)] = bp
 
     branch_trace = []
+    recorded = 0
     process.Continue()
 
     while process.GetState() == lldb.eStateStopped:
@@ -43,16 +56,45 @@ def run_with_breakpoints(binary, arguments, branches):
         pc = frame.GetPC()
         rflags = frame.FindRegister("rflags").GetValueAsUnsigned()
 
-        branch_trace.append({hex(pc): rflags})
+        if writer is None:
+            branch_trace.append({hex(pc): rflags})
+        else:
+            writer.write(pc, rflags)
+
+        # window offsets count branch hits, the records decode() keeps
+        if sampler is not None and pc in breakpoints:
+            recorded += 1
+            if sampler.due():
+                for address in sampler.next_window(recorded - 1):
+                    breakpoints[address].SetEnabled(True)
+            if not sampler.hit(pc):
+                breakpoints[pc].SetEnabled(False)
 
         process.Continue()
 
     return branch_trace
 
 
-def run_analysis(binary, arguments, filename, shlib=False):
-    asm = subprocess.check_output(["otool", "-tv", binary], text=True)
-    branches = parse_branches(asm.splitlines())
+def run_analysis(
+    binary,
+    arguments,
+    filename,
+    shlib=False,
+    fd=None,
+    cache=True,
+    coverage=False,
+    budget=None,
+    interval=1.0,
+    metadata=None,
+):
+    """Trace binary, writing (pc, rflags) records to fd if given, else JSON
+    to stdout.
+
+    With coverage, a one-shot run first narrows the branches to those
+    executed; with a budget, hits are sampled per window and the sampler's
+    metadata is written as JSON to the metadata path.
+    """
+    branches = disassemble(binary, Cache() if cache else None)
 
     if shlib:
         with open("lldb_disassemble/branch_instructions.json", "r") as f:
@@ -60,5 +102,25 @@ def run_analysis(binary, arguments, filename, shlib=False):
 
         branches.update(shared_lib_branches)
 
-    branch_trace = run_with_breakpoints(binary, arguments, branches)
-    json.dump(branch_trace, sys.stdout, indent=2)
+    if coverage:
+        executed = run_with_breakpoints(binary, arguments, branches, one_shot=True)
+        hit = {pc for entry in executed or [] for pc in entry}
+        executed = {pc: branches[pc] for pc in branches if pc in hit}
+        print(
+            f"Coverage: {len(executed)}/{len(branches)} branches executed",
+            file=sys.stderr,
+        )
+        branches = executed
+
+    sampler = Sampler(budget, interval) if budget else None
+    if fd is not None:
+        writer = RecordWriter(fd)
+        run_with_breakpoints(binary, arguments, branches, sampler, writer=writer)
+        writer.close()
+    else:
+        branch_trace = run_with_breakpoints(binary, arguments, branches, sampler)
+        json.dump(branch_trace, sys.stdout, indent=2)
+
+    if sampler is not None and metadata is not None:
+        with open(metadata, "w") as f:
+            json.dump(sampler.metadata(), f)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Conditional branch extraction from ELF binaries without otool.
+
+The executable sections are read straight out of the mmapped file and swept
+with an x86-64 instruction length decoder that only fully decodes the Jcc
+forms (0x70-0x7F rel8 and 0x0F 0x80-0x8F rel32). objdump -d output can be
+parsed into the same {addr: {"instruction", "target"}} mapping instead.
+"""
+
+import re
+import sys
+import json
+import mmap
+import struct
+import subprocess
+
+from collections import namedtuple
+
+ELF_MAGIC = b"\x7fELF"
+SHF_EXECINSTR = 0x4
+SHT_PROGBITS = 1
+PT_LOAD = 1
+
+# Jcc mnemonics by condition code, as printed by otool and objdump
+CONDITIONS = [
+    "jo",
+    "jno",
+    "jb",
+    "jae",
+    "je",
+    "jne",
+    "jbe",
+    "ja",
+    "js",
+    "jns",
+    "jp",
+    "jnp",
+    "jl",
+    "jge",
+    "jle",
+    "jg",
+]
+
+Section = namedtuple("Section", "name type flags addr offset size")
+Segment = namedtuple("Segment", "type flags offset vaddr filesz memsz")
+
+
+def is_elf(path):
+    with open(path, "rb") as f:
+        return f.read(len(ELF_MAGIC)) == ELF_MAGIC
+
+
+def read_sections(data):
+    """Section headers of a little-endian ELF64 image"""
+    if data[:4] != ELF_MAGIC:
+        raise ValueError("Not an ELF file")
+    if data[4] != 2 or data[5] != 1:
+        raise ValueError("Only little-endian ELF64 binaries are supported")
+
+    (shoff,) = struct.unpack_from("<Q", data, 0x28)
+    shentsize, shnum, shstrndx = struct.unpack_from("<HHH", data, 0x3A)
+
+    headers = [
+        struct.unpack_from("<IIQQQQ", data, shoff + i * shentsize) for i in range(shnum)
+    ]
+    names = headers[shstrndx][4] if shnum else 0
+
+    sections = []
+    for name, type_, flags, addr, offset, size in headers:
+        end = data.find(b"\0", names + name)
+        sections.append(
+            Section(data[names + name : end].decode(), type_, flags, addr, offset, size)
+        )
+    return sections
+
+
+def read_segments(data):
+    """Program headers of a little-endian ELF64 image"""
+    (phoff,) = struct.unpack_from("<Q", data, 0x20)
+    phentsize, phnum = struct.unpack_from("<HH", data, 0x36)
+    segments = []
+    for i in range(phnum):
+        type_, flags, offset, vaddr, _, filesz, memsz, _ = struct.unpack_from(
+            "<IIQQQQQQ", data, phoff + i * phentsize
+        )
+        segments.append(Segment(type_, flags, offset, vaddr, filesz, memsz))
+    return segments
+
+
+def load_bias(segments, start, offset):
+    """Difference between run-time and link-time addresses for a mapping of
+    file offset at address start"""
+    for segment in segments:
+        if segment.type != PT_LOAD:
+            continue
+        # mappings start on a page boundary at or before the segment
+        first = segment.offset & ~0xFFF
+        if first <= offset < segment.offset + max(segment.filesz, 1):
+            return start - (segment.vaddr + offset - segment.offset)
+    raise ValueError(f"No PT_LOAD segment covers file offset {offset:#x}")
+
+
+# one-byte opcode map: ModRM present and immediate kind
+IMM8, IMM16, IMMZ, ENTER, MOFFS, IMMV, GROUP3 = range(1, 8)
+
+MODRM = bytearray(256)
+for row in range(0x00, 0x40, 0x08):
+    MODRM[row : row + 4] = b"\1" * 4
+for op in [0x63, 0x69, 0x6B, *range(0x80, 0x90), 0xC0, 0xC1, 0xC6, 0xC7]:
+    MODRM[op] = 1
+for op in [*range(0xD0, 0xD4), *range(0xD8, 0xE0), 0xF6, 0xF7, 0xFE, 0xFF]:
+    MODRM[op] = 1
+
+IMMEDIATE = bytearray(256)
+for op in [*range(0x04, 0x40, 0x08), 0x6A, 0x6B, *range(0x70, 0x80), 0x80, 0x82]:
+    IMMEDIATE[op] = IMM8
+for op in [0x83, 0xA8, *range(0xB0, 0xB8), 0xC0, 0xC1, 0xC6, 0xCD, 0xD4, 0xD5]:
+    IMMEDIATE[op] = IMM8
+for op in [*range(0xE0, 0xE8), 0xEB]:
+    IMMEDIATE[op] = IMM8
+for op in [*range(0x05, 0x40, 0x08), 0x68, 0x69, 0x81, 0xA9, 0xC7, 0xE8, 0xE9]:
+    IMMEDIATE[op] = IMMZ
+IMMEDIATE[0xC2] = IMMEDIATE[0xCA] = IMM16
+IMMEDIATE[0xC8] = ENTER
+IMMEDIATE[0xA0:0xA4] = bytes([MOFFS]) * 4
+IMMEDIATE[0xB8:0xC0] = bytes([IMMV]) * 8
+IMMEDIATE[0xF6] = IMMEDIATE[0xF7] = GROUP3
+
+# two-byte (0x0F) opcode map
+MODRM_0F = bytearray(b"\1") * 256
+for op in [0x05, 0x06, 0x07, 0x08, 0x09, 0x0B, 0x0E, *range(0x30, 0x38), 0x77]:
+    MODRM_0F[op] = 0
+for op in [*range(0x80, 0x90), 0xA0, 0xA1, 0xA2, 0xA8, 0xA9, 0xAA]:
+    MODRM_0F[op] = 0
+MODRM_0F[0xC8:0xD0] = bytes(8)
+
+IMM8_0F = bytearray(256)
+for op in [0x0F, 0x70, 0x71, 0x72, 0x73, 0xA4, 0xAC, 0xBA, 0xC2, 0xC4, 0xC5, 0xC6]:
+    IMM8_0F[op] = 1
+
+PREFIXES = bytearray(256)
+for op in [0x26, 0x2E, 0x36, 0x3E, 0x64, 0x65, 0x66, 0x67, 0xF0, 0xF2, 0xF3]:
+    PREFIXES[op] = 1
+
+
+def modrm_length(code, pos):
+    """Bytes used by the ModRM byte at pos and its SIB and displacement"""
+    modrm = code[pos]
+    mod, rm = modrm >> 6, modrm & 7
+    if mod == 3:
+        return 1
+    length = 1
+    if rm == 4:
+        length += 1
+        if mod == 0 and code[pos + 1] & 7 == 5:
+            length += 4
+    elif mod == 0 and rm == 5:
+        length += 4
+    if mod == 1:
+        length += 1
+    elif mod == 2:
+        length += 4
+    return length
+
+
+def vex_length(code, pos, map_select, opcode):
+    """Length of the ModRM onwards for a VEX/EVEX/XOP encoded opcode"""
+    if map_select == 1 and opcode == 0x77:  # vzeroupper / vzeroall
+        return 0
+    length = modrm_length(code, pos)
+    if map_select in (3, 8) or (map_select == 1 and IMM8_0F[opcode]):
+        length += 1
+    elif map_select == 10:
+        length += 4
+    return length
+
+
+def find_branches(code, address, branches=None):
+    """Linear sweep over code mapped at address, collecting Jcc instructions"""
+    branches = {} if branches is None else branches
+    end = len(code)
+    # pad so a truncated final instruction cannot index past the end
+    code = bytes(code) + bytes(15)
+    pos = 0
+    while pos < end:
+        start = pos
+        opsize = addrsize = rex_w = False
+        op = code[pos]
+        while PREFIXES[op]:
+            opsize |= op == 0x66
+            addrsize |= op == 0x67
+            pos += 1
+            op = code[pos]
+        if 0x40 <= op <= 0x4F:
+            rex_w = op & 8
+            pos += 1
+            op = code[pos]
+        pos += 1
+
+        if 0x70 <= op <= 0x7F:
+            pos += 1
+            offset = code[pos - 1]
+            offset -= (offset & 0x80) << 1
+            branches[hex(address + start)] = {
+                "instruction": CONDITIONS[op & 0xF],
+                "target": hex(address + pos + offset),
+            }
+        elif op == 0x0F:
+            op = code[pos]
+            pos += 1
+            if 0x80 <= op <= 0x8F:
+                pos += 4
+                (offset,) = struct.unpack_from("<i", code, pos - 4)
+                branches[hex(address + start)] = {
+                    "instruction": CONDITIONS[op & 0xF],
+                    "target": hex(address + pos + offset),
+                }
+            elif op == 0x38:
+                pos += 1 + modrm_length(code, pos + 1)
+            elif op == 0x3A:
+                pos += 2 + modrm_length(code, pos + 1)
+            else:
+                if MODRM_0F[op]:
+                    pos += modrm_length(code, pos)
+                pos += IMM8_0F[op]
+        elif op == 0xC5:
+            opcode = code[pos + 1]
+            pos += 2
+            pos += vex_length(code, pos, 1, opcode)
+        elif op == 0xC4 or (op == 0x8F and code[pos] & 0x38):
+            opcode = code[pos + 2]
+            map_select = code[pos] & 0x1F
+            pos += 3
+            pos += vex_length(code, pos, map_select, opcode)
+        elif op == 0x62:
+            opcode = code[pos + 3]
+            map_select = code[pos] & 0x7
+            pos += 4
+            pos += vex_length(code, pos, map_select, opcode)
+        else:
+            if MODRM[op]:
+                reg = code[pos] >> 3 & 7
+                pos += modrm_length(code, pos)
+            kind = IMMEDIATE[op]
+            if kind == IMM8:
+                pos += 1
+            elif kind == IMMZ:
+                pos += 2 if opsize else 4
+            elif kind == IMMV:
+                pos += 8 if rex_w else 2 if opsize else 4
+            elif kind == IMM16:
+                pos += 2
+            elif kind == ENTER:
+                pos += 3
+            elif kind == MOFFS:
+                pos += 4 if addrsize else 8
+            elif kind == GROUP3 and reg < 2:
+                pos += 1 if op == 0xF6 else 2 if opsize else 4
+    return branches
+
+
+class ElfFile:
+    """mmap-backed ELF image exposing its executable sections"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sections = read_sections(self._mmap)
+        self.segments = read_segments(self._mmap)
+
+    def code_sections(self):
+        """(section, bytes view) for every executable PROGBITS section"""
+        view = memoryview(self._mmap)
+        for section in self.sections:
+            if section.type == SHT_PROGBITS and section.flags & SHF_EXECINSTR:
+                yield section, view[section.offset : section.offset + section.size]
+
+    def branches(self):
+        branches = {}
+        for section, code in self.code_sections():
+            find_branches(code, section.addr, branches)
+            code.release()
+        return branches
+
+
+OBJDUMP_BRANCH = re.compile(
+    r"^\s*([0-9a-f]+):\s+(?:(?:bnd|notrack|ds|cs)\s+)*(j[a-z]+)(?:,p[tn])?\s+"
+    r"([0-9a-f]+)",
+    re.MULTILINE,
+)
+
+
+def parse_objdump(text):
+    """Jcc instructions from objdump -d --no-show-raw-insn output"""
+    return {
+        hex(int(addr, 16)): {"instruction": inst, "target": hex(int(target, 16))}
+        for addr, inst, target in OBJDUMP_BRANCH.findall(text)
+        if inst in CONDITIONS
+    }
+
+
+def elf_branches(path, objdump=False):
+    """{addr: {"instruction", "target"}} for an ELF binary"""
+    if objdump:
+        asm = subprocess.check_output(
+            ["objdump", "-d", "--no-show-raw-insn", path], text=True
+        )
+        return parse_objdump(asm)
+    return ElfFile(path).branches()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: elf.py <binary> [--objdump]")
+        sys.exit(1)
+
+    # parse_branches.json
+    branches = elf_branches(sys.argv[1], "--objdump" in sys.argv)
+    json.dump(branches, sys.stdout, indent=2)
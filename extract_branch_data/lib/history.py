@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 import json
 import sys
+import numpy as np
+
+from lib.elf import CONDITIONS
 
 
 def will_branch_be_taken(instruction, flags):
@@ -60,6 +63,75 @@ def history(trace, branches):
     return branch_history
 
 
+# vectorized decoding: the flag bits the conditions read, in truth table order
+FLAG_BITS = (0, 2, 6, 7, 11)  # CF, PF, ZF, SF, OF
+
+# condition codes by mnemonic; anything else maps to an all not-taken row
+CODES = {instruction: code for code, instruction in enumerate(CONDITIONS)}
+UNKNOWN = len(CONDITIONS)
+
+
+def _truth_table():
+    """Outcome of every condition code for every combination of FLAG_BITS,
+    evaluated with the reference will_branch_be_taken"""
+    table = np.zeros((UNKNOWN + 1, 1 << len(FLAG_BITS)), dtype=np.uint8)
+    for instruction, code in CODES.items():
+        for index in range(1 << len(FLAG_BITS)):
+            flags = sum((index >> i & 1) << bit for i, bit in enumerate(FLAG_BITS))
+            table[code, index] = will_branch_be_taken(instruction, flags)
+    return table
+
+
+TRUTH_TABLE = _truth_table()
+
+
+def flag_index(rflags):
+    """Pack the FLAG_BITS of each rflags value into a truth table column"""
+    flags = np.asarray(rflags, dtype=np.uint64).astype(np.intp)
+    index = np.zeros(len(flags), dtype=np.intp)
+    for i, bit in enumerate(FLAG_BITS):
+        index |= (flags >> (bit - i) if bit > i else flags) & (1 << i)
+    return index
+
+
+class BranchIndex:
+    """Dense branch IDs: position in a sorted array of branch addresses"""
+
+    def __init__(self, branches):
+        pcs = np.fromiter(
+            (int(pc, 16) for pc in branches), dtype=np.uint64, count=len(branches)
+        )
+        codes = np.fromiter(
+            (CODES.get(b["instruction"], UNKNOWN) for b in branches.values()),
+            dtype=np.intp,
+            count=len(branches),
+        )
+        order = np.argsort(pcs)
+        self.pcs = pcs[order]
+        self.codes = codes[order]
+
+    def lookup(self, pcs):
+        """(ids, found) for an array of PCs"""
+        ids = np.searchsorted(self.pcs, pcs)
+        ids[ids == len(self.pcs)] = 0
+        found = self.pcs[ids] == pcs if len(self.pcs) else np.zeros(len(pcs), bool)
+        return ids, found
+
+
+def decode(pcs, rflags, branches):
+    """Vectorized history(): (pcs, taken) arrays for the trace entries at
+    known branches, given uint64 pc and rflags arrays"""
+    if not isinstance(branches, BranchIndex):
+        branches = BranchIndex(branches)
+    pcs = np.asarray(pcs, dtype=np.uint64)
+    rflags = np.asarray(rflags)
+    ids, found = branches.lookup(pcs)
+    if not found.all():
+        pcs, rflags, ids = pcs[found], rflags[found], ids[found]
+    taken = TRUTH_TABLE[branches.codes[ids], flag_index(rflags)]
+    return pcs, taken
+
+
 if __name__ == "__main__":
     with open("trace.json", "r") as f:
         trace = json.load(f)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Branch discovery for every ELF module mapped into a running process.
+
+The executable mappings in /proc/<pid>/maps name the modules; each module
+is scanned for conditional branches in a process pool (memoized per file
+in a lib.cache.Cache) and the link-time addresses are rebased by the
+module's load bias.
+"""
+
+import os
+import sys
+import json
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.elf import ElfFile, is_elf, load_bias
+from lib.parse_branches import disassemble
+
+Mapping = namedtuple("Mapping", "start end perms offset path")
+Module = namedtuple("Module", "path start end bias")
+
+
+def read_maps(pid):
+    mappings = []
+    with open(f"/proc/{pid}/maps") as f:
+        for line in f:
+            fields = line.split(maxsplit=5)
+            start, end = (int(x, 16) for x in fields[0].split("-"))
+            path = fields[5].strip() if len(fields) == 6 else ""
+            mappings.append(Mapping(start, end, fields[1], int(fields[2], 16), path))
+    return mappings
+
+
+def executable_modules(pid):
+    """Module per executable file mapping, with its load bias"""
+    modules = []
+    for mapping in read_maps(pid):
+        if "x" not in mapping.perms or not os.path.isfile(mapping.path):
+            continue
+        if not is_elf(mapping.path):
+            continue
+        segments = ElfFile(mapping.path).segments
+        bias = load_bias(segments, mapping.start, mapping.offset)
+        modules.append(Module(mapping.path, mapping.start, mapping.end, bias))
+    return modules
+
+
+def rebase(branches, bias):
+    return {
+        hex(int(addr, 16) + bias): {
+            "instruction": branch["instruction"],
+            "target": hex(int(branch["target"], 16) + bias),
+        }
+        for addr, branch in branches.items()
+    }
+
+
+def module_branches(modules, cache=None, jobs=None):
+    """Run-time {addr: {"instruction", "target"}} for all modules"""
+    paths = sorted({module.path for module in modules})
+    with ProcessPoolExecutor(jobs) as pool:
+        found = dict(zip(paths, pool.map(disassemble, paths, [cache] * len(paths))))
+
+    branches = {}
+    for module in modules:
+        for addr, branch in rebase(found[module.path], module.bias).items():
+            if module.start <= int(addr, 16) < module.end:
+                branches[addr] = branch
+    return branches
+
+
+if __name__ == "__main__":
+    # branches of every module mapped into a running process
+    modules = executable_modules(int(sys.argv[1]))
+    json.dump(module_branches(modules), sys.stdout, indent=2)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""PC to module resolution over the load ranges in a trace's metadata.
+
+Module ranges are kept as sorted start/end arrays, so a whole chunk of PCs
+resolves with one searchsorted. A module-relative PC is the link-time
+address (pc - load bias) tagged with the module number above bit 48, which
+x86-64 user addresses never reach: it is the same in every run whatever
+the load addresses, and its low bits are what the predictors hash.
+"""
+
+import os
+import sys
+import numpy as np
+
+from lib.stream import TraceReader
+
+TAG_SHIFT = np.uint64(48)
+OFFSET_MASK = np.uint64((1 << 48) - 1)
+
+
+class ModuleIndex:
+    """Interval index of loaded modules, from {path, start, end, bias} dicts"""
+
+    def __init__(self, modules):
+        modules = sorted(modules, key=lambda module: module["start"])
+        self.paths = [module["path"] for module in modules]
+        self.starts = np.array([m["start"] for m in modules], dtype=np.uint64)
+        self.ends = np.array([m["end"] for m in modules], dtype=np.uint64)
+        self.biases = np.array([m["bias"] for m in modules], dtype=np.uint64)
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """Index of a trace's modules metadata, or None if it has none"""
+        modules = metadata.get("modules")
+        return cls(modules) if modules else None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def names(self):
+        return [os.path.basename(path) for path in self.paths]
+
+    def lookup(self, pcs):
+        """Module number of each PC, -1 outside every module"""
+        pcs = np.asarray(pcs, dtype=np.uint64)
+        ids = np.searchsorted(self.starts, pcs, side="right").astype(np.int64) - 1
+        inside = ids >= 0
+        inside[inside] = pcs[inside] < self.ends[ids[inside]]
+        ids[~inside] = -1
+        return ids
+
+    def to_offsets(self, pcs):
+        """(module numbers, link-time offsets), unmapped PCs left as they are"""
+        pcs = np.asarray(pcs, dtype=np.uint64)
+        ids = self.lookup(pcs)
+        offsets = pcs.copy()
+        inside = ids >= 0
+        offsets[inside] -= self.biases[ids[inside]]
+        return ids, offsets
+
+    def to_pcs(self, ids, offsets):
+        """Run-time PCs of (module number, offset) pairs"""
+        ids = np.asarray(ids, dtype=np.int64)
+        pcs = np.array(offsets, dtype=np.uint64)
+        inside = ids >= 0
+        pcs[inside] += self.biases[ids[inside]]
+        return pcs
+
+    def relative(self, pcs):
+        """Module-relative PCs: offset | (module number + 1) << 48"""
+        ids, offsets = self.to_offsets(pcs)
+        return offsets | ((ids + 1).astype(np.uint64) << TAG_SHIFT)
+
+    def absolute(self, keys):
+        """Inverse of relative()"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        ids = (keys >> TAG_SHIFT).astype(np.int64) - 1
+        return self.to_pcs(ids, keys & OFFSET_MASK)
+
+    def label(self, pc, relative=False):
+        """Name a PC as module+offset, e.g. libc.so.6+0x1234"""
+        if relative:
+            module, offset = int(pc) >> 48, int(pc) & ((1 << 48) - 1)
+            if module == 0:
+                return hex(offset)
+            return f"{os.path.basename(self.paths[module - 1])}+{offset:#x}"
+        ids, offsets = self.to_offsets([pc])
+        if ids[0] < 0:
+            return hex(int(pc))
+        return f"{os.path.basename(self.paths[ids[0]])}+{int(offsets[0]):#x}"
+
+    def summarize(self, pcs, executions, mispredictions, relative=False):
+        """Per module (static branches, executions, mispredictions), with
+        unmapped PCs in a last row"""
+        if relative:
+            ids = (np.asarray(pcs, dtype=np.uint64) >> TAG_SHIFT).astype(np.int64) - 1
+        else:
+            ids = self.lookup(pcs)
+        bins = np.where(ids < 0, len(self), ids)
+        rows = len(self) + 1
+        return (
+            np.bincount(bins, minlength=rows),
+            np.bincount(bins, weights=executions, minlength=rows).astype(np.int64),
+            np.bincount(bins, weights=mispredictions, minlength=rows).astype(np.int64),
+        )
+
+    def report(self, name, stats, relative=False):
+        """Print per-module accuracy from a PCStats"""
+        static, executions, missed = self.summarize(
+            stats.pcs, stats.executions, stats.mispredictions, relative
+        )
+        print(f"{name} per-module mispredictions:")
+        print(
+            f"  {'module':<32} {'static':>8} {'executions':>12} "
+            f"{'mispredicted':>12} {'accuracy':>8}"
+        )
+        for module, n, runs, miss in zip(
+            [*self.names(), "(unmapped)"], static, executions, missed
+        ):
+            if runs == 0:
+                continue
+            print(
+                f"  {module:<32} {n:>8,} {runs:>12,} {miss:>12,} "
+                f"{1 - miss / runs:>8.4f}"
+            )
+
+
+class RelativeReader:
+    """TraceReader whose chunks carry module-relative PCs"""
+
+    def __init__(self, reader, index):
+        self.reader = reader
+        self.index = index
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
+
+    def chunks(self):
+        for pcs, taken in self.reader.chunks():
+            yield self.index.relative(pcs), taken
+
+
+if __name__ == "__main__":
+    # per-module branch counts of a trace recorded with module metadata
+    reader = TraceReader(sys.argv[1])
+    index = ModuleIndex.from_metadata(reader.metadata)
+    if index is None:
+        sys.exit(f"{sys.argv[1]} has no modules metadata")
+    counts = np.zeros(len(index) + 1, dtype=np.int64)
+    taken_counts = np.zeros(len(index) + 1, dtype=np.int64)
+    for pcs, taken in reader.chunks():
+        ids = index.lookup(pcs)
+        bins = np.where(ids < 0, len(index), ids)
+        counts += np.bincount(bins, minlength=len(counts))
+        taken_counts += np.bincount(bins, weights=taken, minlength=len(counts)).astype(
+            np.int64
+        )
+    for module, n, t in zip([*index.names(), "(unmapped)"], counts, taken_counts):
+        if n:
+            print(f"{module:<32} {n:>12,} branches {t / n:>6.1%} taken")
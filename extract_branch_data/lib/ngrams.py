@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Counts of every n-bit outcome pattern, per length, in one pass each.
+
+Each window of the history is packed into an integer (oldest outcome in
+the high bit, so numeric order is string order) and rolled forward one bit
+per length, and np.bincount counts all windows of that length at once.
+Rotation classes (necklaces) are folded from those counts through a table
+of each code's smallest rotation.
+"""
+
+import numpy as np
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def canonical_rotations(length):
+    """Smallest rotation of every length-bit code"""
+    mask = (1 << length) - 1
+    codes = np.arange(1 << length, dtype=np.uint32)
+    smallest, rotated = codes.copy(), codes.copy()
+    for _ in range(length - 1):
+        rotated = ((rotated << 1) | (rotated >> (length - 1))) & mask
+        np.minimum(smallest, rotated, out=smallest)
+    return smallest
+
+
+def window_codes(taken, length, chunk_size=1 << 20):
+    """Yield every length-bit window (up to 64) as uint64 codes, a chunk of
+    windows at a time"""
+    taken = np.asarray(taken, dtype=np.uint64)
+    for start in range(0, len(taken) - length + 1, chunk_size):
+        stop = min(start + chunk_size, len(taken) - length + 1)
+        codes = np.zeros(stop - start, dtype=np.uint64)
+        for offset in range(length):
+            codes <<= np.uint64(1)
+            codes |= taken[start + offset : stop + offset]
+        yield codes
+
+
+def to_pattern(code, length):
+    return format(int(code), f"0{length}b")
+
+
+def rotations(pattern):
+    return {pattern[i:] + pattern[:i] for i in range(len(pattern))}
+
+
+def bordered(length):
+    """Codes that can overlap a shifted copy of themselves"""
+    codes = np.arange(1 << length, dtype=np.uint32)
+    overlaps = np.zeros(len(codes), dtype=bool)
+    for shift in range(1, length):
+        low = codes & ((1 << (length - shift)) - 1)
+        overlaps |= (codes >> shift) == low
+    return overlaps
+
+
+def non_overlapping(codes, length, counts):
+    """Recount bordered codes like str.count, which skips past each match.
+
+    Within each code's sorted positions, the match after position p is the
+    first one at p + length or later; the greedy chain from the first
+    position is measured by pointer jumping, so all codes are done at once.
+    """
+    counts = counts.copy()
+    keep = np.isin(codes, np.flatnonzero(bordered(length) & (counts > 1)))
+    if not keep.any():
+        return counts
+
+    values = codes[keep].astype(np.int64)
+    positions = np.flatnonzero(keep)
+    span = len(codes) + length
+    keys = np.sort(values * span + positions)
+    values = keys // span
+
+    end = len(keys)
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    group_end = np.repeat(np.r_[starts[1:], end], np.diff(np.r_[starts, end]))
+    following = np.searchsorted(keys, keys + length)
+    following[following >= group_end] = end
+
+    # chain lengths to the end of each group by pointer doubling
+    steps = np.r_[np.ones(end, dtype=np.int64), 0]
+    jump = np.r_[following, end]
+    while (jump[:-1] != end).any():
+        steps[:-1] += np.where(jump[:-1] != end, steps[jump[:-1]], 0)
+        jump[:-1] = jump[jump[:-1]]
+    counts[values[starts]] = steps[starts]
+    return counts
+
+
+class NGramCounts:
+    """Pattern counts of a 0/1 outcome array for every length in a range.
+
+    With legacy=True the counts follow the old viz.py loops: each pattern is
+    counted without overlaps (str.count), rotation classes are those seen in
+    all but the last window, and each is represented by its first rotation
+    seen rather than its smallest.
+    """
+
+    def __init__(self, taken, min_length=4, max_length=16, legacy=False):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.legacy = legacy
+        self.windows = {}
+        self.counts = {}
+
+        taken = np.asarray(taken, dtype=np.uint32)
+        codes = taken.copy()
+        for length in range(1, max_length + 1):
+            if length > 1:
+                codes = (codes[:-1] << 1) | taken[length - 1 :]
+            if length < min_length:
+                continue
+            counts = np.bincount(codes, minlength=1 << length)
+            if legacy:
+                self.windows[length] = codes
+                counts = non_overlapping(codes, length, counts)
+            self.counts[length] = counts
+
+    def lengths(self):
+        return range(self.min_length, self.max_length + 1)
+
+    def rotation_classes(self, length):
+        """(representative codes, total counts) of each rotation class seen,
+        most frequent first"""
+        table = canonical_rotations(length)
+        folded = np.bincount(
+            table, weights=self.counts[length], minlength=len(table)
+        ).astype(np.int64)
+
+        if self.legacy:
+            seen = self.windows[length][:-1]
+            classes, first = np.unique(table[seen], return_index=True)
+            representatives = seen[first]
+        else:
+            classes = np.flatnonzero(folded)
+            representatives = classes
+        counts = folded[classes]
+        order = np.argsort(-counts, kind="stable")
+        return representatives[order], counts[order]
@@ -2,6 +2,10 @@
 import sys
 import re
 import json
+import subprocess
+
+from lib.elf import is_elf, elf_branches
+from lib.cache import file_hash, make_key, tool_version
 
 # All conditional branch instructions we care about
 BRANCH_INSTRUCTIONS = {
@@ -57,6 +61,28 @@ def parse_branches(asm: list[str]):
     return branches
 
 
+def disassemble(binary, cache=None):
+    """Conditional branches of binary, read directly from ELF files on Linux
+    and from otool -tv output on macOS, memoized in a lib.cache.Cache"""
+    elf = is_elf(binary)
+    if cache is not None:
+        tool = "elf" if elf else tool_version("otool")
+        key = make_key("branches", file_hash(binary), tool)
+        branches = cache.load_json("branches", key)
+        if branches is not None:
+            return branches
+
+    if elf:
+        branches = elf_branches(binary)
+    else:
+        asm = subprocess.check_output(["otool", "-tv", binary], text=True)
+        branches = parse_branches(asm.splitlines())
+
+    if cache is not None:
+        cache.put_json("branches", key, branches)
+    return branches
+
+
 if __name__ == "__main__":
     # otool -tv /usr/local/bin/tree
     asm = sys.stdin.readlines()
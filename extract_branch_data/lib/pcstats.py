@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import json
+import numpy as np
+
+
+class PCStats:
+    """Per static branch execution, taken and misprediction counts.
+
+    Chunks are grouped with np.unique and merged into arrays kept sorted by
+    PC, so the cost per chunk is a sort and a searchsorted, not a Python loop.
+    """
+
+    def __init__(self):
+        self.pcs = np.zeros(0, dtype=np.uint64)
+        self.executions = np.zeros(0, dtype=np.int64)
+        self.taken = np.zeros(0, dtype=np.int64)
+        self.mispredictions = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.pcs)
+
+    def grow(self, pcs):
+        """Insert PCs not seen before, keeping the arrays sorted"""
+        merged = np.union1d(self.pcs, pcs)
+        if len(merged) == len(self.pcs):
+            return
+        where = np.searchsorted(merged, self.pcs)
+        for name in ("executions", "taken", "mispredictions"):
+            counts = np.zeros(len(merged), dtype=np.int64)
+            counts[where] = getattr(self, name)
+            setattr(self, name, counts)
+        self.pcs = merged
+
+    def add(self, pcs, taken, predictions):
+        unique, inverse = np.unique(pcs, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        missed = np.asarray(predictions, dtype=bool) != np.asarray(taken, dtype=bool)
+
+        self.grow(unique)
+        where = np.searchsorted(self.pcs, unique)
+        self.executions[where] += np.bincount(inverse, minlength=len(unique))
+        self.taken[where] += np.bincount(
+            inverse[np.asarray(taken, dtype=bool)], minlength=len(unique)
+        )
+        self.mispredictions[where] += np.bincount(
+            inverse[missed], minlength=len(unique)
+        )
+
+    def top(self, n=20):
+        """Indices of the n PCs with the most mispredictions"""
+        order = np.lexsort((-self.executions, -self.mispredictions))
+        return order[:n]
+
+    def report(self, name, n=20, branches=None, modules=None, relative=False):
+        """Print the top n rows, labelled from parse_branches output if given.
+
+        With a ModuleIndex, PCs are shown as module+offset; relative says the
+        PCs are already module-relative."""
+        total = int(self.mispredictions.sum())
+        width = 14 if modules is None else 32
+        print(f"{name} per-branch mispredictions ({len(self)} static branches):")
+        label = f" {'inst':<5} {'target':<14}" if branches is not None else ""
+        print(
+            f"  {'pc':<{width}}{label} {'executions':>12} {'mispredicted':>12} "
+            f"{'share':>6} {'accuracy':>8} {'taken':>6} {'bias':>6}"
+        )
+        for i in self.top(n).tolist():
+            pc = int(self.pcs[i])
+            executions = int(self.executions[i])
+            missed = int(self.mispredictions[i])
+            taken_rate = self.taken[i] / executions
+            if modules is None:
+                address = f"{pc:#x}"
+            else:
+                address = modules.label(pc, relative)
+                if relative:
+                    pc = int(modules.absolute([pc])[0])
+            if branches is not None:
+                info = branches.get(hex(pc), {})
+                label = (
+                    f" {info.get('instruction', '?'):<5} {info.get('target', '?'):<14}"
+                )
+            print(
+                f"  {address:<{width}}{label} {executions:>12,} {missed:>12,} "
+                f"{missed / total if total else 0:>6.1%} "
+                f"{1 - missed / executions:>8.4f} {taken_rate:>6.2f} "
+                f"{max(taken_rate, 1 - taken_rate):>6.2f}"
+            )
+
+
+def load_branches(path):
+    """parse_branches.json: {hex addr: {"instruction", "target"}}"""
+    with open(path) as f:
+        return json.load(f)
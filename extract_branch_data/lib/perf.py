@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Branch histories from saved `perf script` LBR output.
+
+Record with `perf record -b` (or `-j any,u`) and save
+`perf script -F ip,brstack --show-mmap-events`, optionally gzip or xz
+compressed. Each sample's branch stack lists its last taken branches as
+from/to/flags entries, newest first. Replayed oldest first, every
+conditional branch between one entry's target and the next entry's source
+fell through, so the gaps are filled in as not-taken from the binary's
+branch set. The M/P flags give the hardware's own misprediction of each
+recorded taken conditional branch. Samples are unrelated snapshots, so the
+trace offset where each one starts is kept as a sampling window.
+
+The input is read in blocks of whole lines and each block's entries are
+matched with one regex and decoded with NumPy, so memory stays bounded by
+the block size.
+"""
+
+import os
+import re
+import gzip
+import lzma
+import numpy as np
+
+from lib.elf import PT_LOAD, ElfFile, load_bias
+from lib.pcstats import PCStats
+
+BLOCK_SIZE = 1 << 24
+
+# a from/to/flags branch stack entry, or the end of a sample's line
+ENTRY = re.compile(rb"(0x[0-9a-f]+)/(0x[0-9a-f]+)/([MP-])/|(\n)")
+MMAP = re.compile(
+    rb"PERF_RECORD_MMAP2? [^\[]*\[(0x[0-9a-f]+)\((0x[0-9a-f]+)\) @ (\S+)"
+    rb"[^\]]*\]: (\S+) (\S+)"
+)
+
+# longest fall-through between two taken branches, longer gaps are
+# interrupts or context switches and are skipped
+MAX_GAP = 1 << 16
+
+
+def open_input(path):
+    """Open a perf script dump, decompressing .gz and .xz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".xz"):
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_blocks(f, block_size=BLOCK_SIZE):
+    """Yield blocks of complete lines"""
+    rest = b""
+    while block := f.read(block_size):
+        block = rest + block
+        end = block.rfind(b"\n") + 1
+        rest = block[end:]
+        if end:
+            yield block[:end]
+    if rest:
+        yield rest + b"\n"
+
+
+def parse_hex(values):
+    return np.array([int(value, 16) for value in values], dtype=np.uint64)
+
+
+class LBRDecoder:
+    """Turns branch stack entries into (pc, taken) histories of one binary.
+
+    PCs are link-time addresses of the binary, like the other backends
+    record. Per-PC hardware mispredictions of the taken conditional
+    branches are accumulated in self.hardware, a PCStats whose
+    "predictions" are the hardware's (taken unless flagged M).
+    """
+
+    def __init__(self, binary, branches, bias=None):
+        self.binary = binary
+        self.path = os.path.realpath(binary)
+        self.segments = ElfFile(binary).segments
+        self.conditional = np.sort(parse_hex(list(branches)))
+        self.bias = bias
+        self.hardware = PCStats()
+        self.samples = 0
+        self.entries = 0
+        self.skipped = 0
+        self.position = 0
+        self.windows = []
+
+    def mmap(self, block):
+        """Pick up the binary's load bias from its executable mmap event"""
+        for start, _, pgoff, perms, path in MMAP.findall(block):
+            if b"x" in perms and os.fsdecode(path) == self.path:
+                start, offset = int(start, 16), int(pgoff, 0)
+                self.bias = load_bias(self.segments, start, offset)
+
+    def position_independent(self):
+        loads = [s.vaddr for s in self.segments if s.type == PT_LOAD]
+        return min(loads, default=0) == 0
+
+    def entries_of(self, block):
+        """(from, to, mispredicted, flagged) in execution order and the
+        first entry of each sample"""
+        found = ENTRY.findall(block)
+        newline = np.array([bool(match[3]) for match in found], dtype=bool)
+        sample = np.cumsum(newline)[~newline]
+        entries = [match for match in found if not match[3]]
+        if not entries:
+            empty = np.zeros(0, dtype=np.uint64)
+            none = np.zeros(0, dtype=bool)
+            return empty, empty, none, none, none
+        sources, targets, flags, _ = zip(*entries)
+
+        # newest first within each sample, reverse to execution order
+        order = np.lexsort((-np.arange(len(sample)), sample))
+        sample = sample[order]
+        first = np.ones(len(sample), dtype=bool)
+        first[1:] = sample[1:] != sample[:-1]
+        self.samples += int(np.count_nonzero(first))
+
+        flags = np.array(flags, dtype="S1")[order]
+        return (
+            parse_hex(sources)[order],
+            parse_hex(targets)[order],
+            flags == b"M",
+            flags != b"-",
+            first,
+        )
+
+    def decode(self, block):
+        """(pcs, taken) arrays for the samples in a block of lines"""
+        if b"PERF_RECORD_MMAP" in block:
+            self.mmap(block)
+        sources, targets, mispredicted, flagged, first = self.entries_of(block)
+        self.entries += len(sources)
+        if self.bias is None:
+            if len(sources) and self.position_independent():
+                raise ValueError(
+                    f"No mmap event for {self.binary}: save perf script with "
+                    "--show-mmap-events or pass its load bias"
+                )
+            self.bias = 0
+
+        bias = np.uint64(self.bias)
+        sources, targets = sources - bias, targets - bias
+        conditional = self.conditional
+
+        # not-taken branches run from the previous target to this source
+        lo = np.searchsorted(conditional, np.roll(targets, 1))
+        hi = np.searchsorted(conditional, sources)
+        gap = sources - np.roll(targets, 1)
+        valid = ~first & (np.roll(targets, 1) <= sources) & (gap < MAX_GAP)
+        self.skipped += int(np.count_nonzero(~first & ~valid))
+        fall = np.where(valid, hi - lo, 0)
+
+        # the recorded taken branch itself, if it is a conditional one
+        where = np.minimum(hi, max(len(conditional) - 1, 0))
+        taken_here = np.zeros(len(sources), dtype=bool)
+        if len(conditional):
+            taken_here = conditional[where] == sources
+
+        lengths = fall + taken_here
+        starts = np.cumsum(lengths) - lengths
+        pcs = np.empty(int(lengths.sum()), dtype=np.uint64)
+        taken = np.zeros(len(pcs), dtype=np.uint8)
+
+        group = np.repeat(np.arange(len(fall)), fall)
+        within = np.arange(len(group)) - np.repeat(np.cumsum(fall) - fall, fall)
+        pcs[starts[group] + within] = conditional[lo[group] + within]
+
+        end = starts[taken_here] + fall[taken_here]
+        pcs[end] = sources[taken_here]
+        taken[end] = 1
+
+        # where each sample's branches start, skipping samples without any
+        if len(first):
+            last = np.r_[np.flatnonzero(first)[1:], len(first)] - 1
+            begin, end = starts[first], starts[last] + lengths[last]
+            self.windows.extend((self.position + begin[end > begin]).tolist())
+        self.position += len(pcs)
+
+        # hardware predictions of the flagged taken conditional branches
+        scored = taken_here & flagged
+        self.hardware.add(
+            sources[scored],
+            np.ones(int(np.count_nonzero(scored)), dtype=np.uint8),
+            ~mispredicted[scored],
+        )
+        return pcs, taken
+
+    def decode_file(self, path, block_size=BLOCK_SIZE):
+        """Yield (pcs, taken) batches for a perf script dump"""
+        with open_input(path) as f:
+            for block in read_blocks(f, block_size):
+                yield self.decode(block)
+
+    def metadata(self, path=None):
+        return {
+            "perf": {
+                "script": path,
+                "samples": self.samples,
+                "entries": self.entries,
+                "skipped_gaps": self.skipped,
+                "bias": self.bias,
+            },
+            "sampling": {"windows": self.windows},
+        }
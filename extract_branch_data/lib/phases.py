@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Online phase detection over a branch trace.
+
+The trace is cut into blocks of window / blocks branches. Each block is
+summarized once (taken count, histogram of its k-bit outcome patterns,
+per-PC counts) and the sliding window adds the newest block's summary and
+subtracts the oldest, so the rolling taken rate, pattern entropy and
+working set of PCs cost O(1) amortized per branch. A phase boundary is
+placed where the window's metrics differ most from those one window
+earlier, among consecutive positions where they differ by more than a
+threshold.
+"""
+
+import sys
+import numpy as np
+
+from collections import Counter, deque
+from lib.stream import TraceReader
+
+METRICS = ("taken_rate", "entropy", "working_set")
+
+
+def entropy(histogram):
+    total = histogram.sum()
+    if total == 0:
+        return 0.0
+    frequencies = histogram[histogram > 0] / total
+    return float(0.0 - np.sum(frequencies * np.log2(frequencies)))
+
+
+class PhaseTracker:
+    """Rolling window metrics and phase boundaries, fed chunk by chunk"""
+
+    def __init__(self, window=1 << 16, blocks=8, pattern_length=8, threshold=0.2):
+        self.block = max(1, window // blocks)
+        self.blocks = blocks
+        self.window = self.block * blocks
+        self.pattern_length = pattern_length
+        self.threshold = threshold
+
+        self.recent = deque()
+        self.taken = 0
+        self.histogram = np.zeros(1 << pattern_length, dtype=np.int64)
+        self.working = Counter()
+        self.history = np.zeros(pattern_length - 1, dtype=np.int64)
+
+        self.pending_pcs = np.zeros(0, dtype=np.uint64)
+        self.pending_taken = np.zeros(0, dtype=np.uint8)
+        self.position = 0
+        self.series = {"position": [], **{name: [] for name in METRICS}}
+        self.boundaries = []
+        self.peak = None  # (change, start) of the run above threshold
+
+    def add(self, pcs, taken):
+        pcs = np.concatenate([self.pending_pcs, pcs])
+        taken = np.concatenate([self.pending_taken, taken])
+        full = len(taken) - len(taken) % self.block
+        for start in range(0, full, self.block):
+            end = start + self.block
+            self.add_block(pcs[start:end], taken[start:end])
+        self.pending_pcs, self.pending_taken = pcs[full:], taken[full:]
+
+    def add_block(self, pcs, taken):
+        # patterns ending in this block, continuing the previous one's bits
+        bits = np.concatenate([self.history, taken.astype(np.int64)])
+        codes = np.zeros(len(taken), dtype=np.int64)
+        for offset in range(self.pattern_length):
+            codes = (codes << 1) | bits[offset : offset + len(taken)]
+        self.history = bits[len(bits) - self.pattern_length + 1 :]
+
+        summary = (
+            int(np.count_nonzero(taken)),
+            np.bincount(codes, minlength=len(self.histogram)),
+            np.unique(pcs, return_counts=True),
+        )
+        self.recent.append(summary)
+        self.update(summary, 1)
+        if len(self.recent) > self.blocks:
+            self.update(self.recent.popleft(), -1)
+
+        self.position += len(taken)
+        if len(self.recent) == self.blocks:
+            self.record()
+
+    def update(self, summary, sign):
+        taken, histogram, (pcs, counts) = summary
+        self.taken += sign * taken
+        self.histogram += sign * histogram
+        for pc, count in zip(pcs.tolist(), counts.tolist()):
+            self.working[pc] += sign * count
+            if self.working[pc] == 0:
+                del self.working[pc]
+
+    def record(self):
+        series = self.series
+        series["position"].append(self.position)
+        series["taken_rate"].append(self.taken / self.window)
+        series["entropy"].append(entropy(self.histogram))
+        series["working_set"].append(len(self.working))
+
+        # compare with the window that ended where this one starts
+        if len(series["position"]) <= self.blocks:
+            return
+        change = self.change(-1, -1 - self.blocks)
+        if change >= self.threshold:
+            start = self.position - self.window
+            if self.peak is None or change > self.peak[0]:
+                self.peak = (change, start)
+        else:
+            self.mark()
+
+    def mark(self):
+        """Close a run of large changes with a boundary at its peak"""
+        if self.peak is None:
+            return
+        start = self.peak[1]
+        if not self.boundaries or start - self.boundaries[-1] >= self.window:
+            self.boundaries.append(start)
+        self.peak = None
+
+    def change(self, i, j):
+        """Summed normalized differences between the metrics at i and j"""
+        series = self.series
+        taken = abs(series["taken_rate"][i] - series["taken_rate"][j])
+        patterns = abs(series["entropy"][i] - series["entropy"][j])
+        a, b = series["working_set"][i], series["working_set"][j]
+        working = abs(a - b) / max(a, b, 1)
+        return taken + patterns / self.pattern_length + working
+
+    def phases(self):
+        """(start, end) trace offsets of each phase"""
+        self.mark()
+        starts = [0, *self.boundaries]
+        ends = [*self.boundaries, self.position + len(self.pending_taken)]
+        return list(zip(starts, ends))
+
+
+def detect_phases(reader, **options):
+    """Run a PhaseTracker over a TraceReader's chunks"""
+    tracker = PhaseTracker(**options)
+    for pcs, taken in reader.chunks():
+        tracker.add(pcs, taken)
+    return tracker
+
+
+if __name__ == "__main__":
+    # phase boundaries of a trace
+    tracker = detect_phases(TraceReader(sys.argv[1]))
+    for start, end in tracker.phases():
+        print(f"{start:>12,} - {end:<12,} ({end - start:,} branches)")
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from array import array
+from importlib.metadata import entry_points
+
+# saturating counters: (max state, initial state), taken above max // 2
+COUNTERS = {"1bit": (1, 1), "2bit": (3, 1), "3bit": (7, 3)}
+
+PREDICTORS = {}
+
+
+def register(name):
+    """Class decorator adding a predictor to the registry under name"""
+
+    def decorator(cls):
+        cls.name = name
+        PREDICTORS[name] = cls
+        return cls
+
+    return decorator
+
+
+def load_plugins():
+    """Register predictors published under the gshare.predictors entry point"""
+    for entry in entry_points(group="gshare.predictors"):
+        PREDICTORS.setdefault(entry.name, entry.load())
+
+
+def create(name, size=10, method=None):
+    """Instantiate a registered predictor whose main table has 2**size rows.
+
+    Rows are counters for the counter based predictors, weight vectors for
+    perceptron and the bimodal base for tage, whose tagged tables add
+    2**(size - 1) entries each, so sizes are not equal storage budgets."""
+    if name not in PREDICTORS:
+        load_plugins()
+    if name not in PREDICTORS:
+        raise ValueError(f"Unknown predictor {name!r}, choose from {list(PREDICTORS)}")
+
+    cls = PREDICTORS[name]
+    if cls.uses_counters and method is not None:
+        return cls(size, method)
+    return cls(size)
+
+
+def fold(history, length, bits):
+    """XOR-fold the newest length bits of history down to bits bits"""
+    history &= (1 << length) - 1
+    mask = (1 << bits) - 1
+    folded = 0
+    while history:
+        folded ^= history & mask
+        history >>= bits
+    return folded
+
+
+def global_history(taken, size, initial=0):
+    """Global history register (masked to size bits) seen by each branch"""
+    bits = taken.astype(np.uint64)
+    history = np.zeros(len(bits), dtype=np.uint64)
+    for k in range(1, size + 1):
+        history[k:] |= bits[:-k] << np.uint64(k - 1)
+
+    # history carried over from the previous chunk
+    head = min(size, len(bits))
+    carried = np.uint64(initial) << np.arange(head, dtype=np.uint64)
+    history[:head] |= carried & np.uint64((1 << size) - 1)
+    return history
+
+
+class Counters:
+    """Fixed-size table of saturating counters stored in a bytearray"""
+
+    def __init__(self, entries, method="2bit"):
+        self.max_state, initial = COUNTERS[method]
+        self.threshold = self.max_state // 2
+        self.table = bytearray([initial]) * entries
+
+    def taken(self, index):
+        return self.table[index] > self.threshold
+
+    def update(self, index, taken):
+        state = self.table[index]
+        if taken:
+            if state < self.max_state:
+                self.table[index] = state + 1
+        elif state:
+            self.table[index] = state - 1
+
+
+class Predictor:
+    """predict(pc) is called before update(pc, taken) for every branch"""
+
+    uses_counters = False
+
+    def predict(self, pc):
+        raise NotImplementedError
+
+    def update(self, pc, taken):
+        raise NotImplementedError
+
+    def run(self, pcs, taken):
+        """Predict and train on a chunk of branches, returning the predictions"""
+        predictions = bytearray(len(taken))
+        for i, pc, t in zip(range(len(predictions)), pcs.tolist(), taken.tolist()):
+            predictions[i] = self.predict(pc)
+            self.update(pc, t)
+        return np.frombuffer(predictions, dtype=np.uint8)
+
+
+@register("bimodal")
+class Bimodal(Predictor):
+    uses_counters = True
+
+    def __init__(self, size=10, method="2bit"):
+        self.mask = (1 << size) - 1
+        self.counters = Counters(1 << size, method)
+
+    def predict(self, pc):
+        return self.counters.taken(pc & self.mask)
+
+    def update(self, pc, taken):
+        self.counters.update(pc & self.mask, taken)
+
+
+@register("gshare")
+class GShare(Predictor):
+    uses_counters = True
+
+    def __init__(self, size=10, method="2bit"):
+        self.mask = (1 << size) - 1
+        self.counters = Counters(1 << size, method)
+        self.history = 0
+
+    def index(self, pc):
+        return (pc ^ self.history) & self.mask
+
+    def predict(self, pc):
+        return self.counters.taken(self.index(pc))
+
+    def update(self, pc, taken):
+        self.counters.update(self.index(pc), taken)
+        self.history = ((self.history << 1) | taken) & self.mask
+
+
+@register("gselect")
+class GSelect(GShare):
+    """Concatenates the low PC bits with the low history bits"""
+
+    def __init__(self, size=10, method="2bit"):
+        super().__init__(size, method)
+        self.history_bits = size // 2
+        self.pc_mask = (1 << (size - self.history_bits)) - 1
+        self.history_mask = (1 << self.history_bits) - 1
+
+    def index(self, pc):
+        history = self.history & self.history_mask
+        return ((pc & self.pc_mask) << self.history_bits) | history
+
+
+@register("tournament")
+class Tournament(Predictor):
+    """Bimodal and gshare components with a per-PC 2-bit chooser"""
+
+    uses_counters = True
+
+    def __init__(self, size=10, method="2bit"):
+        self.mask = (1 << size) - 1
+        self.bimodal = Bimodal(size, method)
+        self.gshare = GShare(size, method)
+        self.chooser = Counters(1 << size)  # taken means trust gshare
+
+    def predict(self, pc):
+        if self.chooser.taken(pc & self.mask):
+            return self.gshare.predict(pc)
+        return self.bimodal.predict(pc)
+
+    def update(self, pc, taken):
+        bimodal = self.bimodal.predict(pc)
+        gshare = self.gshare.predict(pc)
+        if bimodal != gshare:
+            self.chooser.update(pc & self.mask, gshare == taken)
+
+        self.bimodal.update(pc, taken)
+        self.gshare.update(pc, taken)
+
+
+@register("perceptron")
+class Perceptron(Predictor):
+    """Jimenez & Lin perceptron predictor with 8-bit weights"""
+
+    def __init__(self, size=10, history_length=24):
+        self.mask = (1 << size) - 1
+        self.history_length = history_length
+        self.row = history_length + 1
+        self.threshold = int(1.93 * history_length + 14)
+        self.weights = array("b", bytes((1 << size) * self.row))
+        self.history = 0
+        self.last = None
+
+    def output(self, pc):
+        if self.last is not None and self.last[0] == pc:
+            return self.last[1]
+
+        weights = self.weights
+        base = (pc & self.mask) * self.row
+        history = self.history
+        y = weights[base]
+        for i in range(1, self.row):
+            y += weights[base + i] if history & 1 else -weights[base + i]
+            history >>= 1
+
+        self.last = (pc, y)
+        return y
+
+    def predict(self, pc):
+        return self.output(pc) >= 0
+
+    def update(self, pc, taken):
+        y = self.output(pc)
+        self.last = None
+
+        if (y >= 0) != bool(taken) or abs(y) <= self.threshold:
+            weights = self.weights
+            base = (pc & self.mask) * self.row
+            t = 1 if taken else -1
+            history = self.history
+            weights[base] = max(-128, min(127, weights[base] + t))
+            for i in range(1, self.row):
+                step = t if history & 1 else -t
+                weights[base + i] = max(-128, min(127, weights[base + i] + step))
+                history >>= 1
+
+        mask = (1 << self.history_length) - 1
+        self.history = ((self.history << 1) | taken) & mask
+
+
+@register("tage")
+class Tage(Predictor):
+    """TAGE-style predictor: a bimodal base plus tagged tables indexed with
+    geometrically increasing history lengths"""
+
+    def __init__(self, size=10, history_lengths=(4, 8, 16, 32, 64), tag_bits=8):
+        self.base = Bimodal(size)
+        self.lengths = history_lengths
+        self.index_bits = max(size - 1, 1)
+        self.index_mask = (1 << self.index_bits) - 1
+        self.tag_bits = tag_bits
+        self.tag_mask = (1 << tag_bits) - 1
+
+        # tags are stored plus one so that zero marks an empty entry
+        entries = 1 << self.index_bits
+        self.counters = [bytearray([3]) * entries for _ in history_lengths]
+        self.tags = [array("H", bytes(2 * entries)) for _ in history_lengths]
+        self.useful = [bytearray(entries) for _ in history_lengths]
+
+        self.history = 0
+        self.history_mask = (1 << max(history_lengths)) - 1
+        self.updates = 0
+        self.last = None
+
+    def lookup(self, pc):
+        """Per-table (index, tag) pairs, provider, prediction and alternate"""
+        if self.last is not None and self.last[0] == pc:
+            return self.last[1]
+
+        slots = []
+        for length in self.lengths:
+            index = (
+                pc
+                ^ (pc >> self.index_bits)
+                ^ fold(self.history, length, self.index_bits)
+            )
+            tag = pc ^ fold(self.history, length, self.tag_bits)
+            tag ^= fold(self.history, length, self.tag_bits - 1) << 1
+            slots.append((index & self.index_mask, tag & self.tag_mask))
+
+        provider = alternate = None
+        for t in reversed(range(len(slots))):
+            index, tag = slots[t]
+            if self.tags[t][index] == tag + 1:
+                if provider is None:
+                    provider = t
+                elif alternate is None:
+                    alternate = t
+                    break
+
+        base = self.base.predict(pc)
+        alt_prediction = (
+            base
+            if alternate is None
+            else self.counters[alternate][slots[alternate][0]] >= 4
+        )
+        prediction = (
+            alt_prediction
+            if provider is None
+            else self.counters[provider][slots[provider][0]] >= 4
+        )
+
+        result = (slots, provider, prediction, alt_prediction)
+        self.last = (pc, result)
+        return result
+
+    def predict(self, pc):
+        return self.lookup(pc)[2]
+
+    def update(self, pc, taken):
+        slots, provider, prediction, alt_prediction = self.lookup(pc)
+        self.last = None
+        taken = bool(taken)
+
+        if provider is None:
+            self.base.update(pc, taken)
+        else:
+            index = slots[provider][0]
+            counters = self.counters[provider]
+            if taken:
+                counters[index] = min(7, counters[index] + 1)
+            else:
+                counters[index] = max(0, counters[index] - 1)
+
+            if prediction != alt_prediction:
+                useful = self.useful[provider]
+                if prediction == taken:
+                    useful[index] = min(3, useful[index] + 1)
+                else:
+                    useful[index] = max(0, useful[index] - 1)
+
+        # allocate an entry in a longer history table on a misprediction
+        if prediction != taken:
+            start = 0 if provider is None else provider + 1
+            longer = range(start, len(self.lengths))
+            free = [t for t in longer if self.useful[t][slots[t][0]] == 0]
+            if free:
+                t = free[0]
+                index, tag = slots[t]
+                self.tags[t][index] = tag + 1
+                self.counters[t][index] = 4 if taken else 3
+            else:
+                for t in longer:
+                    index = slots[t][0]
+                    self.useful[t][index] = max(0, self.useful[t][index] - 1)
+
+        # periodically age the useful bits
+        self.updates += 1
+        if self.updates % (1 << 18) == 0:
+            for useful in self.useful:
+                useful[:] = bytes(len(useful))
+
+        self.history = ((self.history << 1) | taken) & self.history_mask
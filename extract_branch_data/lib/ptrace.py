@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""Minimal x86-64 Linux ptrace tracer driven through ctypes.
+
+Every conditional branch gets an int3. On a hit the tracer reads RIP and
+EFLAGS with one PTRACE_GETREGS, puts the original byte back, single-steps
+the branch and re-arms it, so each branch costs a handful of syscalls
+instead of a debugger stop/continue round trip.
+Signals that arrive during the single step are passed on to the tracee.
+
+One-shot breakpoints skip the single step and stay disarmed, which makes a
+coverage pass nearly free. With a Sampler, a breakpoint stays disarmed once
+its PC used up its budget, until a timer stops the tracee to re-arm it.
+"""
+
+import os
+import ctypes
+import signal
+import struct
+import threading
+
+from lib.maps import executable_modules, module_branches
+
+PTRACE_TRACEME = 0
+PTRACE_POKEUSER = 6
+PTRACE_CONT = 7
+PTRACE_SINGLESTEP = 9
+PTRACE_GETREGS = 12
+PTRACE_SETOPTIONS = 0x4200
+PTRACE_O_EXITKILL = 0x100000
+
+ET_DYN = 3
+AT_ENTRY = 9
+ADDR_NO_RANDOMIZE = 0x0040000
+INT3 = b"\xcc"
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.ptrace.argtypes = [ctypes.c_long, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p]
+libc.ptrace.restype = ctypes.c_long
+
+
+class Registers(ctypes.Structure):
+    """struct user_regs_struct from <sys/user.h>"""
+
+    _fields_ = [
+        (name, ctypes.c_ulonglong)
+        for name in (
+            "r15 r14 r13 r12 rbp rbx r11 r10 r9 r8 rax rcx rdx rsi rdi orig_rax "
+            "rip cs eflags rsp ss fs_base gs_base ds es fs gs"
+        ).split()
+    ]
+
+
+def ptrace(request, pid, addr=0, data=0):
+    if libc.ptrace(request, pid, addr, data) == -1:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"ptrace({request}): {os.strerror(errno)}")
+
+
+def spawn(binary, arguments):
+    """Fork and exec binary under ptrace, returning the pid stopped at exec"""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # fixed load addresses keep traces comparable between runs
+            libc.personality(libc.personality(0xFFFFFFFF) | ADDR_NO_RANDOMIZE)
+            ptrace(PTRACE_TRACEME, 0)
+            os.execvp(binary, [binary, *arguments])
+        finally:
+            os._exit(127)
+
+    _, status = os.waitpid(pid, 0)
+    if not os.WIFSTOPPED(status):
+        raise RuntimeError(f"Failed to start {binary}")
+    ptrace(PTRACE_SETOPTIONS, pid, 0, PTRACE_O_EXITKILL)
+    return pid
+
+
+def load_base(pid, binary):
+    """Address the kernel mapped a position independent binary at, else 0"""
+    with open(binary, "rb") as f:
+        (e_type,) = struct.unpack("<H", f.read(18)[16:])
+    if e_type != ET_DYN:
+        return 0
+
+    path = os.path.realpath(binary)
+    with open(f"/proc/{pid}/maps") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 6 and fields[5] == path and int(fields[2], 16) == 0:
+                return int(fields[0].split("-")[0], 16)
+    raise RuntimeError(f"{binary} is not mapped in process {pid}")
+
+
+def entry_point(pid):
+    """Run-time program entry point from the auxiliary vector"""
+    with open(f"/proc/{pid}/auxv", "rb") as f:
+        auxv = f.read()
+    for key, value in struct.iter_unpack("<QQ", auxv):
+        if key == AT_ENTRY:
+            return value
+    raise RuntimeError(f"No AT_ENTRY in process {pid}")
+
+
+class Tracer:
+    """Runs binary with an int3 on every address, recording {pc: rflags}"""
+
+    def __init__(self, binary, arguments, sampler=None, one_shot=False):
+        self.binary = binary
+        self.sampler = sampler
+        self.one_shot = one_shot
+        self.pid = spawn(binary, arguments)
+        self.base = load_base(self.pid, binary)
+        self.mem = os.open(f"/proc/{self.pid}/mem", os.O_RDWR)
+        self.original = {}
+        self.regs = Registers()
+        self.tick = threading.Event()
+        self.done = threading.Event()
+        self.resumed = set()
+
+    def insert(self, addresses):
+        """Arm a breakpoint at each link-time address"""
+        for address in addresses:
+            address = int(address, 16) + self.base
+            if address not in self.original:
+                self.original[address] = os.pread(self.mem, 1, address)
+                os.pwrite(self.mem, INT3, address)
+
+    def run_to_entry(self):
+        """Continue to the program entry point, when the dynamic loader has
+        mapped every shared library the binary links against"""
+        entry = entry_point(self.pid)
+        original = os.pread(self.mem, 1, entry)
+        os.pwrite(self.mem, INT3, entry)
+        ptrace(PTRACE_CONT, self.pid)
+        while (sig := self.wait()) != signal.SIGTRAP:
+            if sig is None:
+                raise RuntimeError(f"{self.binary} exited before its entry point")
+            ptrace(PTRACE_CONT, self.pid, 0, sig)
+        os.pwrite(self.mem, original, entry)
+        ptrace(PTRACE_POKEUSER, self.pid, Registers.rip.offset, entry)
+
+    def wait(self):
+        """Wait for the next stop, returning its signal or None on exit"""
+        _, status = os.waitpid(self.pid, 0)
+        if os.WIFSTOPPED(status):
+            return os.WSTOPSIG(status)
+        return None
+
+    def timer(self):
+        """Stop the tracee every interval while some breakpoints are disarmed"""
+        while not self.done.wait(self.sampler.interval):
+            if self.sampler.exhausted:
+                self.tick.set()
+                try:
+                    os.kill(self.pid, signal.SIGSTOP)
+                except ProcessLookupError:
+                    return
+
+    def rearm(self, position):
+        for pc in self.sampler.next_window(position):
+            os.pwrite(self.mem, INT3, pc)
+
+    def stopped_by_timer(self, sig, position):
+        """Re-arm exhausted breakpoints if sig is the timer's SIGSTOP"""
+        if sig != signal.SIGSTOP or not self.tick.is_set():
+            return False
+        self.tick.clear()
+        self.rearm(position)
+        return True
+
+    def step(self, pc, sp, position):
+        """Single-step the branch at pc, re-delivering any signal that stops
+        the tracee first. If the signal runs a handler, the stack pointer
+        moves and the branch is still to execute: its next hit at this stack
+        pointer is the same execution resumed, marked so it is not recorded
+        twice. Returns False once the tracee has exited."""
+        sig = 0
+        while True:
+            ptrace(PTRACE_SINGLESTEP, self.pid, 0, sig)
+            sig = self.wait()
+            if sig is None:
+                return False
+            if sig == signal.SIGTRAP:
+                break
+            if self.stopped_by_timer(sig, position):
+                sig = 0
+
+        ptrace(PTRACE_GETREGS, self.pid, 0, ctypes.byref(self.regs))
+        if self.regs.rsp != sp:
+            self.resumed.add((pc, sp))
+        return True
+
+    def run(self):
+        pid, mem, original, regs = self.pid, self.mem, self.original, self.regs
+        sampler, resumed = self.sampler, self.resumed
+        regs_ref = ctypes.byref(regs)
+        rip = Registers.rip.offset
+        branch_trace = []
+
+        if sampler is not None:
+            threading.Thread(target=self.timer, daemon=True).start()
+
+        ptrace(PTRACE_CONT, pid)
+        while (sig := self.wait()) is not None:
+            if self.stopped_by_timer(sig, len(branch_trace)):
+                ptrace(PTRACE_CONT, pid)
+                continue
+            if sig != signal.SIGTRAP:
+                ptrace(PTRACE_CONT, pid, 0, sig)
+                continue
+
+            ptrace(PTRACE_GETREGS, pid, 0, regs_ref)
+            pc = regs.rip - 1
+            if pc not in original:
+                ptrace(PTRACE_CONT, pid)
+                continue
+            sp = regs.rsp
+
+            os.pwrite(mem, original[pc], pc)
+            ptrace(PTRACE_POKEUSER, pid, rip, pc)
+            if (pc, sp) in resumed:
+                # a signal handler interrupted this hit, already recorded
+                resumed.remove((pc, sp))
+            else:
+                branch_trace.append({hex(pc - self.base): regs.eflags})
+                if sampler is not None and sampler.due():
+                    self.rearm(len(branch_trace) - 1)
+                if self.one_shot or (sampler is not None and not sampler.hit(pc)):
+                    # leave the breakpoint disarmed
+                    ptrace(PTRACE_CONT, pid)
+                    continue
+
+            # execute the real instruction, then re-arm the breakpoint
+            if not self.step(pc, sp, len(branch_trace)):
+                break
+            os.pwrite(mem, INT3, pc)
+            ptrace(PTRACE_CONT, pid)
+
+        self.done.set()
+        os.close(mem)
+        return branch_trace
+
+
+def trace_branches(binary, arguments, branches, sampler=None):
+    """Run binary to completion, returning a {pc: rflags} entry per branch hit"""
+    tracer = Tracer(binary, arguments, sampler)
+    tracer.insert(branches)
+    return tracer.run()
+
+
+def trace_process(
+    binary, arguments, sampler=None, one_shot=False, cache=None, branches=None
+):
+    """Trace every conditional branch in the binary and the shared libraries
+    loaded at its entry point (or just the given run-time branches).
+
+    Returns (branches, modules, branch_trace) at run-time addresses, which
+    are stable between runs since address randomization is disabled.
+    Libraries loaded later with dlopen are not traced.
+    """
+    tracer = Tracer(binary, arguments, sampler, one_shot)
+    tracer.run_to_entry()
+    modules = executable_modules(tracer.pid)
+    if branches is None:
+        branches = module_branches(modules, cache)
+    tracer.base = 0
+    tracer.insert(branches)
+    return branches, modules, tracer.run()
+
+
+def coverage(binary, arguments, branches):
+    """The subset of branches executed at least once, found with one-shot
+    breakpoints"""
+    tracer = Tracer(binary, arguments, one_shot=True)
+    tracer.insert(branches)
+    hit = {pc for entry in tracer.run() for pc in entry}
+    return {pc: branches[pc] for pc in branches if pc in hit}
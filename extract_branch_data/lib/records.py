@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Binary (pc, rflags) record stream between tracers and the pipeline.
+
+Each record is two little-endian uint64s, the same layout commands.cpp
+writes from a struct, so a whole stream decodes with one np.frombuffer.
+"""
+
+import os
+import struct
+import numpy as np
+
+RECORD = np.dtype([("pc", "<u8"), ("rflags", "<u8")])
+PACK = struct.Struct("<QQ")
+BUFFER_RECORDS = 4096
+
+
+class RecordWriter:
+    """Buffered writer of (pc, rflags) records to a file descriptor"""
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.buffer = bytearray(PACK.size * BUFFER_RECORDS)
+        self.count = 0
+
+    def write(self, pc, rflags):
+        PACK.pack_into(self.buffer, self.count * PACK.size, pc, rflags)
+        self.count += 1
+        if self.count == BUFFER_RECORDS:
+            self.flush()
+
+    def flush(self):
+        view = memoryview(self.buffer)[: self.count * PACK.size]
+        while view:
+            view = view[os.write(self.fd, view) :]
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+
+
+def read_records(stream):
+    """Read a record stream to EOF as a structured (pc, rflags) array"""
+    data = stream.read()
+    usable = len(data) - len(data) % RECORD.itemsize
+    return np.frombuffer(data, dtype=RECORD, count=usable // RECORD.itemsize)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import time
+
+
+class Sampler:
+    """Per-PC hit budgets that are refilled at the start of each window.
+
+    A breakpoint whose PC used up its budget in the current window is
+    disarmed by the tracer, then re-armed once interval seconds have passed.
+    windows holds the trace offset at which each sampled window starts, so
+    consumers know where the recorded branch stream is discontinuous.
+    """
+
+    def __init__(self, budget, interval=1.0):
+        self.budget = budget
+        self.interval = interval
+        self.hits = {}
+        self.exhausted = []
+        self.windows = [0]
+        self.started = time.monotonic()
+
+    def hit(self, pc):
+        """Count a hit, returning False once pc has used its budget"""
+        count = self.hits.get(pc, 0) + 1
+        self.hits[pc] = count
+        if count < self.budget:
+            return True
+        self.exhausted.append(pc)
+        return False
+
+    def due(self):
+        return bool(self.exhausted) and (
+            time.monotonic() - self.started >= self.interval
+        )
+
+    def next_window(self, position):
+        """Start a new window at trace offset position, returning PCs to re-arm"""
+        rearm, self.exhausted = self.exhausted, []
+        self.hits.clear()
+        self.started = time.monotonic()
+        if position > self.windows[-1]:
+            self.windows.append(position)
+        return rearm
+
+    def metadata(self):
+        return {
+            "sampling": {
+                "budget": self.budget,
+                "interval": self.interval,
+                "windows": self.windows,
+            }
+        }
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from multiprocessing import shared_memory
+
+
+def share_arrays(**arrays):
+    """Copy arrays into one shared memory block for worker processes.
+
+    Returns the SharedMemory (the caller closes and unlinks it) and a small
+    picklable spec for attach_arrays.
+    """
+    layout = []
+    offset = 0
+    for name, array in arrays.items():
+        layout.append((name, array.dtype.str, array.shape, offset))
+        offset += -(-array.nbytes // 8) * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, dtype, shape, start), array in zip(layout, arrays.values()):
+        np.ndarray(shape, dtype, buffer=shm.buf, offset=start)[...] = array
+
+    return shm, {"name": shm.name, "layout": layout}
+
+
+def attach_arrays(spec):
+    """Map the arrays described by a share_arrays spec without copying"""
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    arrays = {
+        name: np.ndarray(shape, dtype, buffer=shm.buf, offset=start)
+        for name, dtype, shape, start in spec["layout"]
+    }
+    return shm, arrays
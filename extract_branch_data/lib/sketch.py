@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import math
+import numpy as np
+
+
+def mix64(keys):
+    """splitmix64 finalizer over a uint64 array"""
+    keys = np.asarray(keys, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return keys ^ (keys >> np.uint64(31))
+
+
+def pair_keys(first, second):
+    """Combine two uint64 arrays into one well-mixed uint64 key per pair"""
+    with np.errstate(over="ignore"):
+        return mix64(mix64(first) + np.asarray(second, dtype=np.uint64))
+
+
+class CountMinSketch:
+    """Fixed-memory frequency estimates that never undercount.
+
+    With total count N an estimate exceeds the true count by more than
+    error_bound() = e / width * N with probability at most exp(-depth).
+    """
+
+    def __init__(self, width=1 << 16, depth=4, seed=0):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        self.salts = rng.integers(1, 1 << 63, size=depth, dtype=np.uint64)
+        self.total = 0
+
+    def columns(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        return [mix64(keys ^ salt) % np.uint64(self.width) for salt in self.salts]
+
+    def add(self, keys, counts=1):
+        counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), np.shape(keys))
+        for row, columns in zip(self.table, self.columns(keys)):
+            np.add.at(row, columns.astype(np.intp), counts)
+        self.total += int(counts.sum())
+
+    def estimate(self, keys):
+        rows = [
+            row[c.astype(np.intp)] for row, c in zip(self.table, self.columns(keys))
+        ]
+        return np.min(rows, axis=0)
+
+    def error_bound(self):
+        return math.e / self.width * self.total
+
+
+class TopK:
+    """Most frequent keys tracked with a count-min sketch and k candidates"""
+
+    def __init__(self, k=20, width=1 << 16, depth=4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.candidates = {}  # key -> (label, estimate)
+
+    def add(self, keys, labels):
+        """Count a batch of uint64 keys, labels[i] describing keys[i]"""
+        if len(keys) == 0:
+            return
+        unique, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        self.sketch.add(unique, counts)
+
+        estimates = self.sketch.estimate(unique)
+        for key, i, estimate in zip(
+            unique.tolist(), first.tolist(), estimates.tolist()
+        ):
+            self.candidates[key] = (labels[i], estimate)
+
+        # refresh the survivors, then keep the k largest
+        keys = np.fromiter(self.candidates, dtype=np.uint64, count=len(self.candidates))
+        for key, estimate in zip(keys.tolist(), self.sketch.estimate(keys).tolist()):
+            self.candidates[key] = (self.candidates[key][0], estimate)
+        if len(self.candidates) > self.k:
+            top = sorted(self.candidates.items(), key=lambda kv: -kv[1][1])[: self.k]
+            self.candidates = dict(top)
+
+    def top(self):
+        """(label, estimate) pairs, most frequent first"""
+        return sorted(self.candidates.values(), key=lambda item: -item[1])
+
+
+class SpaceSaving:
+    """Heavy hitters over exact uint64 keys in a fixed number of counters.
+
+    Batches are merged as exact summaries: a key the counters don't hold may
+    have occurred up to floor() times already, so it enters with that much
+    count and error. Every held key's true count lies in
+    [count - error, count], and any key not held occurred at most floor()
+    times.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.errors = np.zeros(0, dtype=np.int64)
+        self.total = 0
+
+    def floor(self):
+        if len(self.keys) < self.capacity:
+            return 0
+        return int(self.counts.min())
+
+    def add(self, keys):
+        unique, counts = np.unique(
+            np.asarray(keys, dtype=np.uint64), return_counts=True
+        )
+        floor = self.floor()
+        held = len(self.keys)
+        merged, inverse = np.unique(
+            np.concatenate([self.keys, unique]), return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+
+        totals = np.full(len(merged), floor, dtype=np.int64)
+        errors = np.full(len(merged), floor, dtype=np.int64)
+        totals[inverse[:held]] = self.counts
+        errors[inverse[:held]] = self.errors
+        totals[inverse[held:]] += counts
+
+        if len(merged) > self.capacity:
+            keep = np.argpartition(-totals, self.capacity - 1)[: self.capacity]
+            merged, totals, errors = merged[keep], totals[keep], errors[keep]
+        self.keys, self.counts, self.errors = merged, totals, errors
+        self.total += int(counts.sum())
+
+    def top(self, n=20):
+        """(keys, counts, errors) of the n largest counters"""
+        order = np.lexsort((self.keys, -self.counts))[:n]
+        return self.keys[order], self.counts[order], self.errors[order]
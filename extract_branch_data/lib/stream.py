@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import re
+import sys
+import json
+import numpy as np
+
+from lib.btrace import BranchTrace, is_btrace, decode_varints, unzigzag
+
+CHUNK_SIZE = 1 << 16
+BLOCK_SIZE = 1 << 20
+
+WHITESPACE = re.compile(r"\s*")
+RECORD = re.compile(r'\s*,?\s*\{\s*"(0x[0-9a-fA-F]+)"\s*:\s*(\d+|true|false)\s*\}')
+ARRAY_END = re.compile(r"\s*\]")
+
+
+class JsonTraceScanner:
+    """Incremental parser for {"binary": ..., "branch_history": [{pc: taken}]}"""
+
+    def __init__(self, path, block_size=BLOCK_SIZE):
+        self.file = open(path, "r")
+        self.block_size = block_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.metadata = {}
+        self.in_history = False
+
+    def fill(self):
+        """Read another block, dropping the consumed part of the buffer"""
+        if self.eof:
+            return False
+        block = self.file.read(self.block_size)
+        if not block:
+            self.eof = True
+            self.file.close()
+            return False
+        self.buf = self.buf[self.pos :] + block
+        self.pos = 0
+        return True
+
+    def skip(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def expect(self, chars):
+        self.skip()
+        if self.pos >= len(self.buf) or self.buf[self.pos] not in chars:
+            raise ValueError(f"Malformed branch trace: expected one of {chars!r}")
+        self.pos += 1
+        return self.buf[self.pos - 1]
+
+    def value(self):
+        """Decode one JSON value, reading more input until it is complete"""
+        decoder = json.JSONDecoder()
+        self.skip()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def read_metadata(self):
+        """Read top level keys up to the start of branch_history"""
+        self.expect("{")
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key == "branch_history":
+                self.expect("[")
+                self.in_history = True
+                return self.metadata
+            self.metadata[key] = self.value()
+            if self.expect(",}") == "}":
+                return self.metadata
+
+    def records(self):
+        """Yield (pc, taken) for each branch_history entry"""
+        while True:
+            match = RECORD.match(self.buf, self.pos)
+            if match:
+                self.pos = match.end()
+                pc, taken = match.groups()
+                yield int(pc, 16), 1 if taken in ("1", "true") else 0
+            elif ARRAY_END.match(self.buf, self.pos):
+                self.pos = ARRAY_END.match(self.buf, self.pos).end()
+                break
+            elif not self.fill():
+                raise ValueError("Malformed branch trace: truncated branch_history")
+        self.read_trailing()
+
+    def skip_records(self):
+        """Skip to the end of branch_history, whose records hold no ']'"""
+        while (end := self.buf.find("]", self.pos)) < 0:
+            self.pos = len(self.buf)
+            if not self.fill():
+                raise ValueError("Malformed branch trace: truncated branch_history")
+        self.pos = end + 1
+        self.read_trailing()
+
+    def read_trailing(self):
+        """Read metadata keys that follow branch_history"""
+        while self.expect(",}") == ",":
+            key = self.value()
+            self.expect(":")
+            self.metadata[key] = self.value()
+
+
+def rebatch(batches, chunk_size):
+    """Regroup (pcs, taken) batches into exactly chunk_size records"""
+    pending_pcs, pending_taken, pending = [], [], 0
+    for pcs, taken in batches:
+        pending_pcs.append(pcs)
+        pending_taken.append(taken)
+        pending += len(pcs)
+        if pending < chunk_size:
+            continue
+
+        pcs, taken = np.concatenate(pending_pcs), np.concatenate(pending_taken)
+        full = len(pcs) - len(pcs) % chunk_size
+        for start in range(0, full, chunk_size):
+            yield pcs[start : start + chunk_size], taken[start : start + chunk_size]
+        pending_pcs, pending_taken = [pcs[full:]], [taken[full:]]
+        pending = len(pcs) - full
+
+    if pending:
+        yield np.concatenate(pending_pcs), np.concatenate(pending_taken)
+
+
+class TraceReader:
+    """Constant-memory reader over JSON or btrace branch traces"""
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.btrace = BranchTrace(path) if is_btrace(path) else None
+
+        if self.btrace is not None:
+            self.metadata = self.btrace.metadata
+        else:
+            scanner = JsonTraceScanner(path)
+            self.metadata = scanner.read_metadata()
+            # keys written after the records, like a perf import's sampling
+            # windows, are needed before the first chunk is read
+            if scanner.in_history:
+                scanner.skip_records()
+            scanner.file.close()
+
+    @property
+    def binary(self):
+        return self.metadata.get("binary", "")
+
+    @property
+    def arguments(self):
+        return self.metadata.get("arguments", "")
+
+    def _json_batches(self):
+        scanner = JsonTraceScanner(self.path)
+        scanner.read_metadata()
+        records = scanner.records()
+        while True:
+            batch = list(zip(*_take(records, self.chunk_size)))
+            if not batch:
+                break
+            pcs, taken = batch
+            yield np.array(pcs, dtype=np.uint64), np.array(taken, dtype=np.uint8)
+        self.metadata.update(scanner.metadata)
+
+    def _btrace_blocks(self):
+        trace = self.btrace
+        index_bytes = trace.index_bytes
+        last_index, start, offset = 0, 0, 0
+        while offset < len(index_bytes):
+            # varints are at most 10 bytes, so every block ends one
+            block = index_bytes[offset : offset + max(self.chunk_size, 10)]
+            ends = np.flatnonzero((block & 0x80) == 0)
+            block = block[: ends[-1] + 1]
+            offset += len(block)
+
+            index = np.cumsum(unzigzag(decode_varints(block))) + last_index
+            last_index = index[-1]
+
+            end = start + len(index)
+            bits = np.unpackbits(trace.taken_bits[start // 8 : (end + 7) // 8])
+            yield trace.pcs[index], bits[start % 8 : start % 8 + len(index)]
+            start = end
+
+    def chunks(self):
+        """Yield (uint64 pcs, uint8 taken) batches of chunk_size records"""
+        if self.btrace is not None:
+            # blocks end on varint boundaries, regroup them into full chunks
+            yield from rebatch(self._btrace_blocks(), self.chunk_size)
+        else:
+            yield from self._json_batches()
+
+    def __iter__(self):
+        """Yield (pc, taken) tuples"""
+        for pcs, taken in self.chunks():
+            yield from zip(pcs.tolist(), taken.tolist())
+
+
+def _take(iterator, n):
+    for _, item in zip(range(n), iterator):
+        yield item
+
+
+def array_chunks(pcs, taken, chunk_size=CHUNK_SIZE):
+    """Yield (pcs, taken) views of in-memory arrays in chunk_size batches"""
+    for start in range(0, len(pcs), chunk_size):
+        yield pcs[start : start + chunk_size], taken[start : start + chunk_size]
+
+
+def window_chunks(chunks, starts):
+    """Split chunks at the trace offsets in starts, yielding (pcs, taken,
+    position) where position is the offset of the piece in its window"""
+    starts = np.asarray(starts, dtype=np.int64)
+    offset = window_start = 0
+    for pcs, taken in chunks:
+        end = offset + len(taken)
+        inside = starts[(starts > offset) & (starts < end)] - offset
+        for lo, hi in zip([0, *inside.tolist()], [*inside.tolist(), len(taken)]):
+            if lo > 0 or offset in starts:
+                window_start = offset + lo
+            yield pcs[lo:hi], taken[lo:hi], offset + lo - window_start
+        offset = end
+
+
+def read_arrays(path):
+    """Read a whole trace as (metadata, pcs, taken) arrays"""
+    reader = TraceReader(path)
+    pcs, taken = [np.zeros(0, dtype=np.uint64)], [np.zeros(0, dtype=np.uint8)]
+    for chunk_pcs, chunk_taken in reader.chunks():
+        pcs.append(chunk_pcs)
+        taken.append(chunk_taken)
+    return reader.metadata, np.concatenate(pcs), np.concatenate(taken)
+
+
+if __name__ == "__main__":
+    # print (pc, taken) records, e.g. python -m lib.stream tree.btrace | head
+    for pc, taken in TraceReader(sys.argv[1]):
+        print(f"{hex(pc)} {taken}")
@@ -1,28 +1,81 @@
 #!/usr/bin/env python3
 import sys
 import json
+import numpy as np
+
+PC_MARKER = "(unsigned long) 0x"
+FLAGS_MARKER = "rflags = 0x"
 
 
 def parse_lldb_output(output):
     logs = []
     for line in output:
-        if "(unsigned long) 0x" in line:
+        if PC_MARKER in line:
             str_hex = "0x" + line.split("0x")[1].strip()
             pc = hex(int(str_hex, 16))
             logs.append(pc)
-        elif "rflags = 0x" in line:
+        elif FLAGS_MARKER in line:
             flags = int(line.split("0x")[1].strip(), 16)
             logs.append(flags)
 
     return logs
 
 
-def trace(output):
-    logs = parse_lldb_output(output)
+class TraceParser:
+    """State machine pairing each `p/x $pc` line with the next rflags line.
+
+    A pc line while another pc is still waiting, or an rflags line with no
+    pc, is counted in dropped instead of shifting every later pair.
+    """
+
+    def __init__(self):
+        self.pc = None
+        self.dropped = 0
+
+    def feed(self, line):
+        """Consume one line of lldb output, returning (pc, rflags) when a
+        record is complete"""
+        if PC_MARKER in line:
+            if self.pc is not None:
+                self.dropped += 1
+            self.pc = int(line.split("0x")[1].strip(), 16)
+        elif FLAGS_MARKER in line:
+            if self.pc is None:
+                self.dropped += 1
+                return None
+            record = (self.pc, int(line.split("0x")[1].strip(), 16))
+            self.pc = None
+            return record
+        return None
+
 
+def stream_trace(lines, batch_size=4096):
+    """Yield (pc, rflags) uint64 array batches from lldb output as it arrives"""
+    parser = TraceParser()
+    pcs, rflags = [], []
+    for line in lines:
+        record = parser.feed(line)
+        if record is None:
+            continue
+        pcs.append(record[0])
+        rflags.append(record[1])
+        if len(pcs) == batch_size:
+            yield np.array(pcs, dtype=np.uint64), np.array(rflags, dtype=np.uint64)
+            pcs, rflags = [], []
+
+    if pcs:
+        yield np.array(pcs, dtype=np.uint64), np.array(rflags, dtype=np.uint64)
+    if parser.dropped:
+        print(f"Dropped {parser.dropped} unpaired lldb lines", file=sys.stderr)
+
+
+def trace(output):
+    parser = TraceParser()
     trace = []
-    for i in range(0, len(logs), 2):
-        trace.append({logs[i]: logs[i + 1]})
+    for line in output:
+        record = parser.feed(line)
+        if record is not None:
+            trace.append({hex(record[0]): record[1]})
 
     return trace
 
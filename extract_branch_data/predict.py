@@ -1,8 +1,26 @@
 #!/usr/bin/env python3
+import csv
 import json
+import time
 import argparse
+import numpy as np
 
+from array import array
 from operator import xor
+from concurrent.futures import ProcessPoolExecutor
+from lib.stream import TraceReader, array_chunks, read_arrays, window_chunks
+from lib.shared import share_arrays, attach_arrays
+from lib.predictors import (
+    COUNTERS,
+    PREDICTORS,
+    create,
+    global_history,
+    load_plugins,
+)
+from lib.aliasing import AliasAnalyzer
+from lib.pcstats import PCStats, load_branches
+from lib.modules import ModuleIndex, RelativeReader
+from lib.phases import detect_phases
 
 
 def make_concat(size):
@@ -17,36 +35,71 @@ def make_concat(size):
     return concat
 
 
+def bimodal(pc, history):
+    return pc
+
+
+def history_only(pc, history):
+    return history
+
+
+# largest table size in bits, bigger tables no longer fit in memory
+MAX_SIZE = 24
+
+# hash factories by name, taking the table size
+HASHES = {
+    "gshare": lambda size: xor,
+    "concat": make_concat,
+    "bimodal": lambda size: bimodal,
+    "history": lambda size: history_only,
+}
+
+
 class BranchPredictionTable:
     def __init__(self, hash, size, method="2bit"):
         self.bitmask = (1 << size) - 1
 
         self.method = method
+        self.max_state, self.initial = COUNTERS[method]
         self.hash = hash
-        self.table = {}
+        self.table = bytearray([self.initial]) * (1 << size)
         self.history = 0
 
+        # last PC to use each entry, for occupancy and collision counts
+        self.owners = array("Q", bytes(8 << size))
+        self.touched = bytearray(1 << size)
+        self.occupied = 0
+        self.collisions = 0
+
     def counter(self, taken, prediction):
-        if self.method == "2bit":
+        if self.method in ("2bit", "3bit"):
             if taken:
-                return min(3, prediction + 1)
+                return min(self.max_state, prediction + 1)
             else:
                 return max(0, prediction - 1)
         elif self.method == "1bit":
             return taken
 
     def update(self, addr, taken):
+        pc = addr
         addr &= self.bitmask
-        history = self.history & self.bitmask
 
-        key = self.hash(addr, history)
+        key = self.hash(addr, self.history)
 
-        prediction = self.table.get(key, 1)
+        prediction = self.table[key]
+        if not self.touched[key]:
+            self.touched[key] = 1
+            self.occupied += 1
+        elif self.owners[key] != pc:
+            self.collisions += 1
+        self.owners[key] = pc
 
         self.table[key] = self.counter(taken, prediction)
-        self.history = (self.history << 1) | taken
+        self.history = ((self.history << 1) | taken) & self.bitmask
 
-        return prediction >= 2 if self.method == "2bit" else prediction
+        if self.method == "1bit":
+            return prediction
+        return prediction > self.max_state // 2
 
 
 def predict(branch_history, func, size=10, method="2bit"):
@@ -59,7 +112,327 @@ def predict(branch_history, func, size=10, method="2bit"):
     return predictions
 
 
+def counter_tables(method):
+    """State transition and prediction lookup tables for a counter method"""
+    bpt = BranchPredictionTable(None, 0, method)
+    states = range(bpt.max_state + 1)
+
+    # transition[state << 1 | taken] is the next counter state
+    transition = bytes(bpt.counter(t, s) for s in states for t in (0, 1))
+    outcome = np.array([s > bpt.max_state // 2 for s in states], dtype=np.uint8)
+    return transition, outcome
+
+
+class NumpyPredictionTable:
+    """BranchPredictionTable over a uint8 array, simulating a chunk at a time"""
+
+    def __init__(self, hash, size, method="2bit"):
+        self.bitmask = (1 << size) - 1
+        self.size = size
+
+        self.method = method
+        self.hash = hash
+        self.transition, self.outcome = counter_tables(method)
+        self.table = np.full(1 << size, COUNTERS[method][1], dtype=np.uint8)
+        self.history = 0
+
+        self.owners = np.zeros(1 << size, dtype=np.uint64)
+        self.touched = np.zeros(1 << size, dtype=bool)
+        self.collisions = 0
+
+    @property
+    def occupied(self):
+        return int(np.count_nonzero(self.touched))
+
+    def track_owners(self, pcs, index):
+        """Count accesses by a different PC than the entry's previous user"""
+        order = np.argsort(index, kind="stable")
+        keys, owners = index[order], pcs[order]
+
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        previous = np.empty_like(owners)
+        previous[1:] = owners[:-1]
+        previous[first] = self.owners[keys[first]]
+        seen = np.ones(len(keys), dtype=bool)
+        seen[first] = self.touched[keys[first]]
+        self.collisions += int(np.count_nonzero(seen & (previous != owners)))
+
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = first[1:]
+        self.owners[keys[last]] = owners[last]
+        self.touched[keys] = True
+
+    def run(self, pcs, taken, history=None):
+        # predictors of the same size can share one history computation
+        if history is None:
+            history = global_history(taken, self.size, self.history)
+        index = self.hash(pcs & np.uint64(self.bitmask), history)
+        self.track_owners(pcs, index)
+
+        # only the saturating counter update is sequential
+        transition = self.transition
+        entries = memoryview(self.table)
+        states = bytearray(len(taken))
+        for i, key, bit in zip(range(len(states)), index.tolist(), taken.tolist()):
+            state = entries[key]
+            states[i] = state
+            entries[key] = transition[state << 1 | bit]
+
+        if len(taken):
+            self.history = (int(history[-1]) << 1 | int(taken[-1])) & self.bitmask
+        return self.outcome[np.frombuffer(states, dtype=np.uint8)]
+
+
+def predict_numpy(pcs, taken, func, size=10, method="2bit"):
+    """Vectorized equivalent of predict() over packed trace arrays"""
+    return NumpyPredictionTable(func, size, method).run(pcs, taken)
+
+
+def make_predictor(kind, name, size=10, method="2bit", engine="python"):
+    """A table over HASHES[name] for kind "hash", else a registered predictor"""
+    if kind == "predictor":
+        return create(name, size, method)
+
+    func = HASHES[name](size)
+    if engine == "numpy":
+        return NumpyPredictionTable(func, size, method)
+    return BranchPredictionTable(func, size, method)
+
+
+def count_correct(bpt, pcs, taken):
+    """Run a chunk of branches through any predictor, counting hits"""
+    if isinstance(bpt, BranchPredictionTable):
+        pairs = zip(pcs.tolist(), taken.tolist())
+        return sum(bpt.update(pc, t) == t for pc, t in pairs)
+    return int(np.count_nonzero(bpt.run(pcs, taken) == taken))
+
+
+def run_predictions(bpt, pcs, taken):
+    """Run a chunk of branches through any predictor, returning its predictions"""
+    if isinstance(bpt, BranchPredictionTable):
+        pairs = zip(pcs.tolist(), taken.tolist())
+        return np.fromiter(
+            (bpt.update(pc, t) for pc, t in pairs), dtype=np.uint8, count=len(taken)
+        )
+    return bpt.run(pcs, taken)
+
+
+def measure_accuracy(reader, bpt, stats=None):
+    """Stream a trace through a predictor, returning (accuracy, branches)
+
+    With a PCStats, also accumulate per-PC counts."""
+    correct = total = 0
+    for pcs, taken in reader.chunks():
+        if stats is None:
+            correct += count_correct(bpt, pcs, taken)
+        else:
+            predictions = run_predictions(bpt, pcs, taken)
+            stats.add(pcs, taken, predictions)
+            correct += int(np.count_nonzero(predictions == taken))
+        total += len(taken)
+    return correct / total, total
+
+
+def windowed_accuracy(reader, make, starts, reset=False, warmup=0, stats=None):
+    """Accuracy over a budget-sampled trace, whose recorded stream is cut at
+    each window start: optionally restart the predictor from make() there,
+    and leave the first warmup branches of every window unscored"""
+    bpt = make()
+    correct = total = 0
+    for pcs, taken, position in window_chunks(reader.chunks(), starts):
+        if reset and position == 0:
+            bpt = make()
+        predictions = run_predictions(bpt, pcs, taken)
+        scored = slice(max(0, warmup - position), None)
+        pcs, taken, predictions = pcs[scored], taken[scored], predictions[scored]
+        if stats is not None:
+            stats.add(pcs, taken, predictions)
+        correct += int(np.count_nonzero(predictions == taken))
+        total += len(taken)
+    return correct / total, total
+
+
+def phase_accuracy(reader, bpt, starts):
+    """Per phase (correct, total) arrays of one continuous run over a trace
+    whose phases begin at the offsets in starts"""
+    correct, total = [], []
+    for pcs, taken, position in window_chunks(reader.chunks(), starts):
+        if position == 0:
+            correct.append(0)
+            total.append(0)
+        predictions = run_predictions(bpt, pcs, taken)
+        correct[-1] += int(np.count_nonzero(predictions == taken))
+        total[-1] += len(taken)
+    return np.array(correct), np.array(total)
+
+
+def _shard_worker(spec, kind, name, size, method, engine, start, end, warmup):
+    shm, arrays = attach_arrays(spec)
+    pcs, taken = arrays["pcs"], arrays["taken"]
+    bpt = make_predictor(kind, name, size, method, engine)
+
+    # rebuild history and table state from the preceding branches
+    first = max(0, start - warmup)
+    count_correct(bpt, pcs[first:start], taken[first:start])
+    correct = count_correct(bpt, pcs[start:end], taken[start:end])
+
+    del arrays, pcs, taken
+    shm.close()
+    return correct
+
+
+def sharded_accuracy(
+    spec, total, predictor, size, method, engine, shards, warmup, jobs
+):
+    """Accuracy from simulating shards in parallel, each after a warm-up prefix"""
+    bounds = np.linspace(0, total, shards + 1).astype(int).tolist()
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [
+            pool.submit(
+                _shard_worker,
+                spec,
+                *predictor,
+                size,
+                method,
+                engine,
+                start,
+                end,
+                warmup,
+            )
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        return sum(future.result() for future in futures) / total
+
+
+def parse_sizes(text):
+    """Parse table sizes like "4-20" or "8,10,12" """
+    sizes = []
+    for part in text.split(","):
+        start, _, end = part.partition("-")
+        sizes.extend(range(int(start), int(end or start) + 1))
+    return sizes
+
+
+def run_sweep(chunks, configs):
+    """Drive every (kind, name, method, size) predictor over one pass"""
+    predictors = [
+        make_predictor(kind, name, size, method, engine="numpy")
+        for kind, name, method, size in configs
+    ]
+    correct = [0] * len(configs)
+    elapsed = [0.0] * len(configs)
+    total = 0
+
+    for pcs, taken in chunks:
+        histories = {}
+        for i, bpt in enumerate(predictors):
+            start = time.perf_counter()
+            if isinstance(bpt, NumpyPredictionTable):
+                if bpt.size not in histories:
+                    history = global_history(taken, bpt.size, bpt.history)
+                    histories[bpt.size] = history
+                output = bpt.run(pcs, taken, histories[bpt.size])
+            else:
+                output = bpt.run(pcs, taken)
+            correct[i] += np.count_nonzero(output == taken)
+            elapsed[i] += time.perf_counter() - start
+        total += len(taken)
+
+    return [
+        {
+            "kind": kind,
+            "name": name,
+            "method": method,
+            "size": size,
+            "accuracy": correct[i] / total,
+            "seconds": elapsed[i],
+            "branches_per_sec": total / elapsed[i] if elapsed[i] else 0.0,
+        }
+        for i, (kind, name, method, size) in enumerate(configs)
+    ]
+
+
+def _sweep_worker(spec, configs, chunk_size):
+    shm, arrays = attach_arrays(spec)
+    chunks = array_chunks(arrays["pcs"], arrays["taken"], chunk_size)
+    results = run_sweep(chunks, configs)
+
+    # views into the block must be gone before it can be closed
+    del arrays, chunks
+    shm.close()
+    return results
+
+
+def sweep(path, configs, jobs=1, modules=None):
+    """Accuracy and timing for every configuration, fanned over jobs processes,
+    on module-relative PCs if given a ModuleIndex"""
+    reader = TraceReader(path)
+    if modules is not None:
+        reader = RelativeReader(reader, modules)
+    if jobs <= 1:
+        return run_sweep(reader.chunks(), configs)
+
+    # decode once into shared memory, then split the configurations
+    _, pcs, taken = read_arrays(path)
+    if modules is not None:
+        pcs = modules.relative(pcs)
+    shm, spec = share_arrays(pcs=pcs, taken=taken)
+    del pcs, taken
+    try:
+        with ProcessPoolExecutor(jobs) as pool:
+            groups = [configs[i::jobs] for i in range(jobs)]
+            futures = [
+                pool.submit(_sweep_worker, spec, group, reader.chunk_size)
+                for group in groups
+                if group
+            ]
+            results = [row for future in futures for row in future.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    order = {config: i for i, config in enumerate(configs)}
+    return sorted(
+        results, key=lambda r: order[r["kind"], r["name"], r["method"], r["size"]]
+    )
+
+
+def write_sweep(results, output):
+    """Write sweep results as JSON if output ends in .json, else as CSV"""
+    with open(output, "w", newline="") as f:
+        if output.endswith(".json"):
+            json.dump(results, f, indent=2)
+            return
+
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def report_phases(reader, predictors, args):
+    """Accuracy of each predictor in each detected phase"""
+    tracker = detect_phases(reader, window=args.phase_window)
+    phases = tracker.phases()
+    starts = [start for start, _ in phases]
+    print(f"Phases: {len(phases)} (window {tracker.window:,} branches)")
+
+    columns = []
+    for predictor in predictors:
+        bpt = make_predictor(*predictor, args.size, args.method, args.engine)
+        correct, total = phase_accuracy(reader, bpt, starts)
+        columns.append(correct / np.maximum(total, 1))
+
+    names = "".join(f" {name:>10}" for _, name in predictors)
+    print(f"  {'start':>12} {'branches':>12}{names}")
+    for i, (start, end) in enumerate(phases):
+        accuracies = "".join(f" {column[i]:>10.4f}" for column in columns)
+        print(f"  {start:>12,} {end - start:>12,}{accuracies}")
+
+
 def main():
+    # list predictors from installed gshare.predictors plugins too
+    load_plugins()
     parser = argparse.ArgumentParser(description="Branch Prediction Simulator")
     parser.add_argument("branch_data", help="Path to the branch trace file")
     parser.add_argument(
@@ -70,38 +443,307 @@ def main():
     )
     parser.add_argument(
         "--method",
-        choices=["1bit", "2bit"],
+        choices=list(COUNTERS),
         default="2bit",
         help="Counter method (default: 2bit)",
     )
+    parser.add_argument(
+        "--engine",
+        choices=["python", "numpy"],
+        default="python",
+        help="Simulation engine (default: python)",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Evaluate every size/method/hash combination in one pass",
+    )
+    parser.add_argument(
+        "--sizes",
+        default="4-20",
+        help="Sweep table sizes, e.g. 4-20 or 8,10,12 (default: 4-20)",
+    )
+    parser.add_argument(
+        "--methods",
+        nargs="+",
+        choices=list(COUNTERS),
+        default=list(COUNTERS),
+        help="Sweep counter methods (default: all)",
+    )
+    parser.add_argument(
+        "--hashes",
+        nargs="*",
+        choices=list(HASHES),
+        default=list(HASHES),
+        help="Sweep hashes, none to sweep only --predictors (default: all)",
+    )
+    parser.add_argument(
+        "--predictor",
+        action="append",
+        choices=list(PREDICTORS),
+        help="Run a registered predictor instead of gshare/concat (repeatable)",
+    )
+    parser.add_argument(
+        "--predictors",
+        default="",
+        help=f"Registered predictors to add to the sweep ({', '.join(PREDICTORS)})",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Sweep worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--output",
+        help="Write sweep results to a .csv or .json file",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the trace into shards simulated in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=10000,
+        help="Branches replayed before each shard to warm it up (default: 10000)",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Also run sequentially and report the sharding error",
+    )
+    parser.add_argument(
+        "--aliasing",
+        action="store_true",
+        help="Break down gshare/concat mispredictions by aliasing cause",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Entries and PC pairs listed in the aliasing report (default: 10)",
+    )
+    parser.add_argument(
+        "--per-pc",
+        type=int,
+        metavar="N",
+        help="List the N static branches with the most mispredictions",
+    )
+    parser.add_argument(
+        "--reset-windows",
+        action="store_true",
+        help="Restart predictors at each window of a budgeted or LBR trace",
+    )
+    parser.add_argument(
+        "--window-warmup",
+        type=int,
+        default=0,
+        help="Branches at the start of each sampled window left unscored",
+    )
+    parser.add_argument(
+        "--per-module",
+        action="store_true",
+        help="Break down accuracy by the binary or library each branch is in",
+    )
+    parser.add_argument(
+        "--module-offsets",
+        action="store_true",
+        help="Hash module-relative PCs instead of run-time addresses",
+    )
+    parser.add_argument(
+        "--phases",
+        action="store_true",
+        help="Detect program phases and report accuracy per phase",
+    )
+    parser.add_argument(
+        "--phase-window",
+        type=int,
+        default=1 << 16,
+        help="Branches per phase detection window (default: 65536)",
+    )
+    parser.add_argument(
+        "--branches",
+        help="parse_branches.json to label --per-pc rows with mnemonic and target",
+    )
 
     args = parser.parse_args()
+    if (args.per_pc or args.per_module or args.phases) and args.shards > 1:
+        parser.error("--per-pc, --per-module and --phases need a sequential run")
+    try:
+        sizes = parse_sizes(args.sizes)
+    except ValueError:
+        parser.error(f"Malformed --sizes {args.sizes!r}, e.g. 4-20 or 8,10,12")
+    if not sizes or not all(1 <= size <= MAX_SIZE for size in [args.size, *sizes]):
+        parser.error(f"Table sizes must be between 1 and {MAX_SIZE} bits")
+    unknown = set(filter(None, args.predictors.split(","))) - set(PREDICTORS)
+    if unknown:
+        parser.error(
+            f"Unknown --predictors {', '.join(sorted(unknown))}, "
+            f"choose from {', '.join(PREDICTORS)}"
+        )
 
-    with open(args.branch_data, "r") as f:
-        branch_data = json.load(f)
+    reader = TraceReader(args.branch_data)
+    modules = ModuleIndex.from_metadata(reader.metadata)
+    if (args.per_module or args.module_offsets) and modules is None:
+        parser.error(
+            f"{args.branch_data} has no modules metadata (trace with --shlibs)"
+        )
+    if args.module_offsets:
+        reader = RelativeReader(reader, modules)
+    else:
+        modules = modules if args.per_module or args.per_pc else None
+    binary = reader.binary
+    arguments = reader.arguments
 
-    binary = branch_data["binary"]
-    arguments = branch_data.get("arguments", "")
-    branch_history = branch_data["branch_history"]
+    if args.sweep:
+        methods = args.methods
+        configs = [
+            ("hash", name, method, size)
+            for name in args.hashes
+            for method in methods
+            for size in sizes
+        ]
+        for name in filter(None, args.predictors.split(",")):
+            counters = PREDICTORS[name].uses_counters
+            configs += [
+                ("predictor", name, method, size)
+                for method in (methods if counters else ["-"])
+                for size in sizes
+            ]
+        print("================================")
+        print(f"Program: {binary} {arguments}")
+        print(f"Sweep: {len(configs)} configurations")
+        print("--------------------------------")
+
+        results = sweep(
+            args.branch_data,
+            configs,
+            args.jobs,
+            modules if args.module_offsets else None,
+        )
+        for r in results:
+            print(
+                f"{r['name']:<10} {r['method']:<4} {r['size']:>2} bits "
+                f"accuracy: {r['accuracy']:.4f} "
+                f"({r['branches_per_sec']:,.0f} branches/s)"
+            )
+        if args.output:
+            write_sweep(results, args.output)
+        return
 
     print("================================")
     print(f"Program: {binary} {arguments}")
     print(f"Table size: {args.size} bits ({2**args.size} entries)")
     print(f"Counter method: {args.method}")
+    sampling = reader.metadata.get("sampling")
+    if sampling:
+        budget = sampling.get("budget")
+        print(
+            f"Sampled: {len(sampling['windows'])} windows"
+            + (f" (budget {budget} hits per branch)" if budget else "")
+        )
     print("--------------------------------")
 
-    hashes = {"gshare": xor, "concat": make_concat(args.size)}
+    if args.aliasing:
+        for name in ("gshare", "concat"):
+            analyzer = AliasAnalyzer(
+                HASHES[name](args.size), args.size, args.method, top=args.top
+            )
+            for pcs, taken in reader.chunks():
+                analyzer.process(pcs, taken)
+            analyzer.report(name)
+        return
+
+    if args.predictor:
+        predictors = [("predictor", name) for name in args.predictor]
+    else:
+        predictors = [("hash", "gshare"), ("hash", "concat")]
+
+    if args.shards > 1:
+        print(f"Shards: {args.shards} (warm-up {args.warmup} branches)")
+        _, pcs, taken = read_arrays(args.branch_data)
+        if args.module_offsets:
+            pcs = modules.relative(pcs)
+        shm, spec = share_arrays(pcs=pcs, taken=taken)
+        total = len(taken)
+        del pcs, taken
+
+    windowed = sampling and (args.reset_windows or args.window_warmup)
 
     results = []
-    for name, func in hashes.items():
-        output = predict(branch_history, func, size=args.size, method=args.method)
-        correct = sum(1 for p in output if p["taken"] == p["prediction"])
-        accuracy = correct / len(output)
-        results.append((name, accuracy))
-
-    max_name_len = max(len(name) for name, _ in results)
-    for name, accuracy in results:
-        print(f"{name:<{max_name_len}} accuracy: {accuracy:.4f}")
+    try:
+        for predictor in predictors:
+            bpt = make_predictor(*predictor, args.size, args.method, args.engine)
+            stats = PCStats() if args.per_pc or args.per_module else None
+            start = time.perf_counter()
+            if args.shards > 1:
+                accuracy = sharded_accuracy(
+                    spec,
+                    total,
+                    predictor,
+                    args.size,
+                    args.method,
+                    args.engine,
+                    args.shards,
+                    args.warmup,
+                    args.jobs if args.jobs > 1 else args.shards,
+                )
+            elif windowed:
+                accuracy, total = windowed_accuracy(
+                    reader,
+                    lambda: make_predictor(
+                        *predictor, args.size, args.method, args.engine
+                    ),
+                    sampling["windows"],
+                    args.reset_windows,
+                    args.window_warmup,
+                    stats,
+                )
+            else:
+                accuracy, total = measure_accuracy(reader, bpt, stats)
+            rate = total / (time.perf_counter() - start)
+
+            exact = None
+            if args.exact and args.shards > 1:
+                exact, _ = measure_accuracy(reader, bpt)
+            if args.shards > 1 or windowed or not hasattr(bpt, "collisions"):
+                bpt = None
+            results.append((predictor[1], accuracy, rate, exact, bpt, stats))
+    finally:
+        if args.shards > 1:
+            shm.close()
+            shm.unlink()
+
+    max_name_len = max(len(name) for name, *_ in results)
+    for name, accuracy, rate, exact, bpt, _ in results:
+        line = f"{name:<{max_name_len}} accuracy: {accuracy:.4f}"
+        line += f" ({rate:,.0f} branches/s)"
+        if exact is not None:
+            line += f" (sequential {exact:.4f}, error {accuracy - exact:+.4f})"
+        print(line)
+        if bpt is not None:
+            print(
+                f"{'':<{max_name_len}} table: {bpt.occupied}/{len(bpt.table)} "
+                f"entries used, {bpt.collisions} collisions"
+            )
+
+    if args.phases:
+        print("--------------------------------")
+        report_phases(reader, predictors, args)
+
+    if args.per_module:
+        for name, *_, stats in results:
+            print("--------------------------------")
+            modules.report(name, stats, args.module_offsets)
+
+    if args.per_pc:
+        branches = load_branches(args.branches) if args.branches else None
+        for name, *_, stats in results:
+            print("--------------------------------")
+            stats.report(name, args.per_pc, branches, modules, args.module_offsets)
 
 
 if __name__ == "__main__":
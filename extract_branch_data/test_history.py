@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import numpy as np
+
+from lib.elf import CONDITIONS
+from lib.history import decode, history
+
+
+def make_branches(rng, n=64):
+    pcs = rng.choice(1 << 32, size=n, replace=False) + 0x100000000
+    return {
+        hex(int(pc)): {"instruction": CONDITIONS[i % len(CONDITIONS)], "target": "0x0"}
+        for i, pc in enumerate(pcs)
+    }
+
+
+def reference(pcs, rflags, branches):
+    trace = [{hex(pc): f} for pc, f in zip(pcs.tolist(), rflags.tolist())]
+    return history(trace, branches)
+
+
+def test_decode_matches_history():
+    rng = np.random.default_rng(0)
+    branches = make_branches(rng)
+    known = np.array([int(pc, 16) for pc in branches], dtype=np.uint64)
+
+    # every low 12 bit flag pattern at every branch, plus unknown PCs
+    pcs = np.repeat(known, 1 << 12)
+    rflags = np.tile(np.arange(1 << 12, dtype=np.uint64), len(known))
+    unknown = rng.integers(0, 1 << 32, size=1000, dtype=np.uint64)
+    pcs = np.concatenate([pcs, unknown])
+    rflags = np.concatenate([rflags, rng.integers(0, 1 << 22, 1000, np.uint64)])
+    order = rng.permutation(len(pcs))
+    pcs, rflags = pcs[order], rflags[order]
+
+    decoded_pcs, taken = decode(pcs, rflags, branches)
+    decoded = [{hex(pc): t} for pc, t in zip(decoded_pcs.tolist(), taken.tolist())]
+    assert decoded == reference(pcs, rflags, branches)
+
+
+def test_unknown_mnemonic_is_not_taken():
+    branches = {"0x1000": {"instruction": "jrcxz", "target": "0x1010"}}
+    pcs = np.array([0x1000, 0x2000], dtype=np.uint64)
+    rflags = np.array([0xFFF, 0xFFF], dtype=np.uint64)
+
+    decoded_pcs, taken = decode(pcs, rflags, branches)
+    assert decoded_pcs.tolist() == [0x1000]
+    assert taken.tolist() == [0]
+    assert reference(pcs, rflags, branches) == [{"0x1000": 0}]
+
+
+def test_empty():
+    decoded_pcs, taken = decode(
+        np.zeros(0, np.uint64),
+        np.zeros(0, np.uint64),
+        make_branches(np.random.default_rng(1), 4),
+    )
+    assert len(decoded_pcs) == len(taken) == 0
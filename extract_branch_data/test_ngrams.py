@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import numpy as np
+import pytest
+
+from lib.ngrams import NGramCounts, rotations, to_pattern
+
+
+def reference(taken, length):
+    """{first seen rotation: count} from the old viz.py str.count loops"""
+    history_str = "".join(map(str, taken.tolist()))
+    groups, seen = {}, set()
+    for i in range(len(history_str) - length):
+        pattern = history_str[i : i + length]
+        if pattern not in seen:
+            total = 0
+            for rotation in rotations(pattern):
+                total += history_str.count(rotation)
+                seen.add(rotation)
+            groups[pattern] = total
+    return groups
+
+
+@pytest.mark.parametrize("length", [4, 5, 6, 8])
+@pytest.mark.parametrize("bias", [0.5, 0.9])
+def test_legacy_counts_match_str_count(length, bias):
+    rng = np.random.default_rng(length)
+    taken = (rng.random(3000) < bias).astype(np.uint8)
+
+    codes, counts = NGramCounts(taken, length, length, legacy=True).rotation_classes(
+        length
+    )
+    found = {to_pattern(c, length): n for c, n in zip(codes.tolist(), counts.tolist())}
+    assert found == reference(taken, length)
+    assert counts.tolist() == sorted(counts.tolist(), reverse=True)
+
+
+def test_overlapping_counts_every_window():
+    taken = np.array([1, 1, 1, 1, 1, 0, 1], dtype=np.uint8)
+    counts = NGramCounts(taken, 2, 3).counts
+    assert counts[2].tolist() == [0, 1, 1, 4]
+    assert counts[3][0b111] == 3
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import sys
+import numpy as np
+import pytest
+
+from lib.perf import LBRDecoder
+
+BRANCHES = ["0x1000", "0x1010", "0x1020", "0x1030", "0x2000"]
+
+# perf script -F ip,brstack lines, branch stacks newest first
+SCRIPT = (
+    # 0x1010 taken, 0x1020 falls through, 0x1030 taken
+    "  401000 0x1030/0x3000/P/-/-/1 0x1010/0x1020/M/-/-/1\n"
+    # no conditional branch, no window
+    "  401000 0x5000/0x6000/-/-/-/1\n"
+    # the target is past the next source, so the gap is skipped
+    "  401000 0x1000/0x4000/-/-/-/1 0x1030/0x2100/P/-/-/1\n"
+)
+
+
+@pytest.mark.parametrize("block_size", [16, 1 << 20])
+def test_decode_fills_gaps_and_marks_windows(tmp_path, block_size):
+    path = tmp_path / "perf.txt"
+    path.write_text(SCRIPT)
+
+    # any ELF will do, the load bias is given
+    decoder = LBRDecoder(sys.executable, BRANCHES, bias=0)
+    batches = list(decoder.decode_file(str(path), block_size))
+    pcs = np.concatenate([p for p, _ in batches])
+    taken = np.concatenate([t for _, t in batches])
+
+    assert [hex(pc) for pc in pcs.tolist()] == [
+        "0x1010",
+        "0x1020",
+        "0x1030",
+        "0x1030",
+        "0x1000",
+    ]
+    assert taken.tolist() == [1, 0, 1, 1, 1]
+    assert decoder.windows == [0, 3]
+    assert (decoder.samples, decoder.entries, decoder.skipped) == (3, 5, 1)
+
+    # only the M/P flagged taken conditional branches are scored
+    hardware = decoder.hardware
+    assert [hex(pc) for pc in hardware.pcs.tolist()] == ["0x1010", "0x1030"]
+    assert hardware.executions.tolist() == [1, 2]
+    assert hardware.mispredictions.tolist() == [1, 0]
+    assert decoder.metadata()["sampling"] == {"windows": [0, 3]}
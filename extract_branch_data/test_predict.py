@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import numpy as np
+import pytest
+
+from operator import xor
+from predict import BranchPredictionTable, NumpyPredictionTable, make_concat
+
+
+def random_trace(rng, n=5000, static=200):
+    """Branches from a few hundred PCs, each with its own taken bias"""
+    addresses = rng.integers(0x400000, 0x500000, size=static, dtype=np.uint64)
+    bias = rng.random(static)
+    which = rng.integers(0, static, size=n)
+    taken = (rng.random(n) < bias[which]).astype(np.uint8)
+    return addresses[which], taken
+
+
+@pytest.mark.parametrize("method", ["1bit", "2bit", "3bit"])
+@pytest.mark.parametrize("hash", ["gshare", "concat"])
+@pytest.mark.parametrize("size", [4, 10, 14])
+def test_numpy_engine_matches_python(method, hash, size):
+    rng = np.random.default_rng(size)
+    pcs, taken = random_trace(rng)
+    func = xor if hash == "gshare" else make_concat(size)
+
+    bpt = BranchPredictionTable(func, size, method)
+    expected = [int(bpt.update(pc, t)) for pc, t in zip(pcs.tolist(), taken.tolist())]
+
+    # in uneven chunks, carrying history and counters across them
+    table = NumpyPredictionTable(func, size, method)
+    predictions = np.concatenate(
+        [table.run(pcs[a:b], taken[a:b]) for a, b in [(0, 1), (1, 777), (777, None)]]
+    )
+    assert predictions.tolist() == expected
+    assert table.occupied == bpt.occupied
+    assert table.collisions == bpt.collisions
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+import numpy as np
+import pytest
+
+from lib.sketch import SpaceSaving
+
+
+def exact(keys):
+    unique, counts = np.unique(keys, return_counts=True)
+    return dict(zip(unique.tolist(), counts.tolist()))
+
+
+@pytest.mark.parametrize("capacity", [16, 64, 256])
+def test_space_saving_bounds_contain_exact_counts(capacity):
+    rng = np.random.default_rng(capacity)
+    keys = rng.zipf(1.3, 50000).astype(np.uint64)
+    true = exact(keys)
+
+    miner = SpaceSaving(capacity)
+    for start in range(0, len(keys), 3000):
+        miner.add(keys[start : start + 3000])
+
+    held = dict(zip(miner.keys.tolist(), zip(miner.counts, miner.errors)))
+    assert len(held) == capacity
+    for key, (count, error) in held.items():
+        assert count - error <= true[key] <= count
+    floor = miner.floor()
+    for key, count in true.items():
+        if key not in held:
+            assert count <= floor
+        # every key above total / capacity is guaranteed a counter
+        if count > len(keys) / capacity:
+            assert key in held
+
+
+def test_space_saving_is_exact_below_capacity():
+    keys = np.random.default_rng(0).integers(0, 50, 10000, dtype=np.uint64)
+    miner = SpaceSaving(64)
+    for start in range(0, len(keys), 999):
+        miner.add(keys[start : start + 999])
+
+    codes, counts, errors = miner.top(64)
+    assert dict(zip(codes.tolist(), counts.tolist())) == exact(keys)
+    assert not errors.any()
+    assert counts.tolist() == sorted(counts.tolist(), reverse=True)
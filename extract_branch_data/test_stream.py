@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import json
+import numpy as np
+import pytest
+
+from lib.btrace import TraceWriter, write_branch_arrays
+from lib.stream import JsonTraceScanner, TraceReader, read_arrays
+
+
+def random_trace(rng, n=20000):
+    pcs = rng.choice(rng.integers(0, 1 << 48, 300, dtype=np.uint64), n)
+    return pcs, rng.integers(0, 2, n, dtype=np.uint8)
+
+
+def reference(path):
+    """(pcs, taken) of a JSON trace loaded whole with json.load"""
+    with open(path) as f:
+        history = json.load(f)["branch_history"]
+    pairs = [(int(pc, 16), t) for record in history for pc, t in record.items()]
+    return [pc for pc, _ in pairs], [t for _, t in pairs]
+
+
+def test_scanner_matches_json_load(tmp_path):
+    pcs, taken = random_trace(np.random.default_rng(0))
+    path = str(tmp_path / "trace.json")
+    write_branch_arrays(path, "a.out", "-x", pcs, taken, extra={"k": [1, 2]})
+    expected_pcs, expected_taken = reference(path)
+
+    # tiny blocks put block boundaries inside every kind of token
+    for block_size in (7, 64, 1 << 20):
+        scanner = JsonTraceScanner(path, block_size)
+        metadata = scanner.read_metadata()
+        records = list(scanner.records())
+        assert metadata == {
+            "binary": "a.out",
+            "arguments": "-x",
+            "extra": {"k": [1, 2]},
+        }
+        assert [pc for pc, _ in records] == expected_pcs
+        assert [t for _, t in records] == expected_taken
+
+
+@pytest.mark.parametrize("suffix", [".json", ".btrace"])
+def test_reader_round_trip(tmp_path, suffix):
+    pcs, taken = random_trace(np.random.default_rng(1))
+    path = str(tmp_path / f"trace{suffix}")
+    with TraceWriter(path, "a.out", "", sampling={"windows": [0, 5]}) as writer:
+        for start in range(0, len(pcs), 3000):
+            writer.write(pcs[start : start + 3000], taken[start : start + 3000])
+        writer.metadata["trailing"] = 1
+
+    reader = TraceReader(path, chunk_size=1000)
+    # trailing JSON metadata is there before any chunk is read
+    assert reader.metadata["trailing"] == 1
+    chunks = list(reader.chunks())
+    assert all(len(chunk_pcs) == 1000 for chunk_pcs, _ in chunks[:-1])
+    assert np.concatenate([c for c, _ in chunks]).tolist() == pcs.tolist()
+    assert np.concatenate([t for _, t in chunks]).tolist() == taken.tolist()
+
+    metadata, read_pcs, read_taken = read_arrays(path)
+    assert metadata["sampling"] == {"windows": [0, 5]}
+    assert metadata["trailing"] == 1
+    assert read_pcs.tolist() == pcs.tolist()
+    assert read_taken.tolist() == taken.tolist()
@@ -1,53 +1,239 @@
 #!/usr/bin/env python3
-import json
-import argparse
-import seaborn as sns
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
+"""Branch history figures.
 
-from matplotlib.colors import LogNorm  # Add this import
+The trace is decoded once and shared with a pool of processes that each
+draw one figure. A figure's analysis (binned image, phase series, pattern
+counts) is computed separately from its drawing and cached on disk by the
+trace's hash and the analysis parameters, so redrawing skips it. pyplot,
+pandas and seaborn are only imported by the code that draws.
+"""
 
+import io
+import os
+import argparse
+import contextlib
+import numpy as np
 
-def create_history_heatmap(branch_history, window_size=32):
-    # Convert branch history into rows of window_size
-    history = [1 if list(inst.values())[0] else 0 for inst in branch_history]
-    rows = [history[i : i + window_size] for i in range(0, len(history), window_size)]
-    # Pad last row if needed
-    if len(rows[-1]) < window_size:
-        rows[-1].extend([0] * (window_size - len(rows[-1])))
+from concurrent.futures import ProcessPoolExecutor
+from lib.cache import Cache, file_hash, make_key
+from lib.stream import read_arrays
+from lib.shared import share_arrays, attach_arrays
+from lib.ngrams import NGramCounts, rotations, to_pattern, window_codes
+from lib.sketch import SpaceSaving
+from lib.phases import PhaseTracker
+
+
+class Analyses:
+    """Intermediate results for one trace, optionally cached on disk"""
+
+    def __init__(self, cache=None, trace=None):
+        self.cache = cache
+        self.trace = trace
+        self.ngrams = {}
+
+    def get(self, name, params, compute):
+        """compute()'s dict of arrays, or the cached one for these params"""
+        if self.cache is None:
+            return compute()
+        key = make_key("viz", self.trace, name, params)
+        arrays = self.cache.load_arrays("analyses", key)
+        if arrays is None:
+            arrays = compute()
+            self.cache.put_arrays("analyses", key, arrays)
+        return arrays
+
+    def rotations(self, taken, min_length, max_length, legacy=False):
+        """One rotation_counts pass per range of lengths, shared by every
+        figure that reads it, in this process or a worker given self"""
+        params = (min_length, max_length, legacy)
+        if params not in self.ngrams:
+            self.ngrams[params] = rotation_counts(taken, *params, analyses=self)
+        return self.ngrams[params]
+
+
+UNCACHED = Analyses()
+
+
+def aggregate(cells, values, size):
+    """Mean of values per cell index, NaN where a cell is empty"""
+    counts = np.bincount(cells, minlength=size)
+    sums = np.bincount(cells, weights=values, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def heatmap_image(taken, window_size, max_rows):
+    windows = max(1, -(-len(taken) // window_size))
+    rows = min(windows, max_rows)
+    index = np.arange(len(taken))
+    cells = (index // window_size) * rows // windows * window_size
+    cells += index % window_size
+    image = aggregate(cells, taken, rows * window_size).reshape(rows, window_size)
+    return {"image": image, "windows": np.int64(windows)}
+
+
+def create_history_heatmap(
+    taken, window_size=32, max_rows=1000, offset=0, analyses=UNCACHED
+):
+    """Rows of window_size outcomes, consecutive windows averaged together
+    when there are more than max_rows; offset is the first branch's index"""
+    import matplotlib.pyplot as plt
+
+    params = [window_size, max_rows, offset, len(taken)]
+    result = analyses.get(
+        "heatmap", params, lambda: heatmap_image(taken, window_size, max_rows)
+    )
+    image, windows = result["image"], int(result["windows"])
+    rows = len(image)
 
+    first = offset // window_size
     plt.figure(figsize=(15, 10))
-    sns.heatmap(rows, cmap="binary", cbar=False)
+    plt.imshow(
+        image,
+        cmap="binary",
+        vmin=0,
+        vmax=1,
+        aspect="auto",
+        interpolation="nearest",
+        extent=(0, window_size, first + windows, first),
+    )
     plt.title("Branch History Heatmap")
     plt.xlabel("Position in Window")
     plt.ylabel("Window Number")
-
-
-def plot_branch_timeline(branch_history):
-    addresses = [int(list(inst.keys())[0], 16) for inst in branch_history]
-    taken = [list(inst.values())[0] for inst in branch_history]
+    if rows < windows:
+        plt.colorbar(label=f"Taken Rate ({windows / rows:.1f} windows per row)")
+
+
+def timeline_image(pcs, taken, width, height):
+    unique, rank = np.unique(pcs, return_inverse=True)
+    columns = max(1, min(len(pcs), width))
+    rows = max(1, min(len(unique), height))
+    x = np.arange(len(pcs)) * columns // max(len(pcs), 1)
+    y = rank.reshape(-1) * rows // max(len(unique), 1)
+    image = aggregate(y * columns + x, taken, rows * columns)
+
+    ticks = np.linspace(0, rows - 1, min(rows, 8)).astype(int)
+    tick_pcs = unique[ticks * len(unique) // rows] if len(unique) else ticks
+    return {
+        "image": image.reshape(rows, columns),
+        "ticks": ticks,
+        "tick_pcs": tick_pcs.astype(np.uint64),
+    }
+
+
+def plot_branch_timeline(
+    pcs, taken, width=1500, height=500, offset=0, analyses=UNCACHED
+):
+    """Taken rate per (execution order, static branch) cell, branches
+    ordered by address"""
+    import matplotlib.pyplot as plt
+
+    params = [width, height, offset, len(pcs)]
+    result = analyses.get(
+        "timeline", params, lambda: timeline_image(pcs, taken, width, height)
+    )
+    image, ticks = result["image"], result["ticks"]
+    rows = len(image)
 
     plt.figure(figsize=(15, 5))
-    plt.scatter(range(len(addresses)), addresses, c=taken, cmap="coolwarm", alpha=0.5)
+    plt.imshow(
+        image,
+        cmap="coolwarm",
+        vmin=0,
+        vmax=1,
+        origin="lower",
+        aspect="auto",
+        interpolation="nearest",
+        extent=(offset, offset + len(pcs), 0, rows),
+    )
+    labels = [hex(pc) for pc in result["tick_pcs"].tolist()]
+    plt.yticks(ticks + 0.5, labels)
     plt.title("Branch Execution Timeline")
     plt.xlabel("Execution Order")
     plt.ylabel("Branch Address")
-    plt.colorbar(label="Taken/Not Taken")
+    plt.colorbar(label="Taken Rate")
+
+
+def tiles(total, count, align=1):
+    """(start, end) bounds splitting total branches into count tiles"""
+    bounds = np.linspace(0, total, count + 1).astype(int) // align * align
+    bounds[-1] = total
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def phase_series(pcs, taken, window):
+    tracker = PhaseTracker(window)
+    tracker.add(pcs, taken)
+    phases = np.array(tracker.phases(), dtype=np.int64).reshape(-1, 2)
+    rates = [taken[start:end].mean() if end > start else 0 for start, end in phases]
+    return {
+        **{name: np.array(values) for name, values in tracker.series.items()},
+        "boundaries": np.array(tracker.boundaries, dtype=np.int64),
+        "phases": phases,
+        "rates": np.array(rates, dtype=np.float64),
+    }
+
+
+def plot_phases(pcs, taken, window=1 << 16, analyses=UNCACHED):
+    """Rolling taken rate, pattern entropy and working set, with the
+    detected phase boundaries"""
+    import matplotlib.pyplot as plt
+
+    series = analyses.get(
+        "phases", [window, len(pcs)], lambda: phase_series(pcs, taken, window)
+    )
+    phases = series["phases"].tolist()
+
+    labels = {
+        "taken_rate": "Taken Rate",
+        "entropy": "8-bit Pattern Entropy",
+        "working_set": "Working Set (PCs)",
+    }
+    fig, axes = plt.subplots(len(labels), 1, figsize=(15, 10), sharex=True)
+    for ax, (metric, label) in zip(axes, labels.items()):
+        ax.plot(series["position"], series[metric])
+        for boundary in series["boundaries"].tolist():
+            ax.axvline(boundary, color="red", linestyle="--", alpha=0.7)
+        ax.set_ylabel(label)
+        ax.grid(True)
+    axes[0].set_title(f"Program Phases ({len(phases)} found, window {window:,})")
+    axes[-1].set_xlabel("Execution Order")
+    plt.tight_layout()
+
+    print("\nPhases:")
+    for (start, end), rate in zip(phases, series["rates"].tolist()):
+        print(f"{start:>12,} - {end:<12,} taken {rate:.3f}")
 
 
-def analyze_patterns(branch_history, pattern_length=8):
-    history = [1 if list(inst.values())[0] else 0 for inst in branch_history]
-    history_str = "".join(map(str, history))
+def pattern_counts(taken, pattern_length, top=20):
+    """The top most common windows, all but the last one counted, ties in
+    order of first appearance"""
+    codes = np.concatenate(
+        [np.zeros(0, dtype=np.uint64), *window_codes(taken[:-1], pattern_length)]
+    )
+    patterns, first, counts = np.unique(codes, return_index=True, return_counts=True)
+    order = np.lexsort((first, -counts))[:top]
+    return {"codes": patterns[order], "counts": counts[order]}
+
+
+def analyze_patterns(taken, pattern_length=8, approx=None, analyses=UNCACHED):
+    """Plot the 20 most common windows; with approx=N counters, estimate
+    them in fixed memory with Space-Saving, for lengths up to 64"""
+    if approx:
+        return analyze_patterns_approx(taken, pattern_length, approx, analyses)
 
-    patterns = {}
-    for i in range(len(history_str) - pattern_length):
-        pattern = history_str[i : i + pattern_length]
-        patterns[pattern] = patterns.get(pattern, 0) + 1
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    result = analyses.get(
+        "patterns",
+        [pattern_length, len(taken)],
+        lambda: pattern_counts(taken, pattern_length),
+    )
+    patterns = [to_pattern(code, pattern_length) for code in result["codes"]]
 
     # Convert to DataFrame for plotting
-    df = pd.DataFrame.from_dict(patterns, orient="index", columns=["count"])
-    df = df.sort_values("count", ascending=False).head(20)
+    df = pd.DataFrame({"count": result["counts"]}, index=patterns)
 
     plt.figure(figsize=(15, 8))
     df["count"].plot(kind="bar")
@@ -57,36 +243,86 @@ def analyze_patterns(branch_history, pattern_length=8):
     plt.xticks(rotation=45)
 
 
-def analyze_patterns_with_rotations(branch_history, pattern_length=8):
-    history = [1 if list(inst.values())[0] else 0 for inst in branch_history]
-    history_str = "".join(map(str, history))
+def approx_pattern_counts(taken, pattern_length, counters, top=20):
+    miner = SpaceSaving(counters)
+    for codes in window_codes(taken, pattern_length):
+        miner.add(codes)
+    codes, counts, errors = miner.top(top)
+    return {
+        "codes": codes,
+        "counts": counts,
+        "errors": errors,
+        "floor": np.int64(miner.floor()),
+    }
 
-    def get_rotations(pattern):
-        rotations = set()
-        for i in range(len(pattern)):
-            rotations.add(pattern[i:] + pattern[:i])
-        return rotations
 
-    # Count patterns including rotations
-    pattern_groups = {}
-    seen_patterns = set()
-
-    for i in range(len(history_str) - pattern_length):
-        pattern = history_str[i : i + pattern_length]
-        if pattern not in seen_patterns:
-            rotations = get_rotations(pattern)
-            total_count = 0
-            for rot in rotations:
-                total_count += history_str.count(rot)
-                seen_patterns.add(rot)
-            pattern_groups[pattern] = {
-                "count": total_count,
-                "rotations": list(rotations),
-            }
+def analyze_patterns_approx(taken, pattern_length, counters, analyses=UNCACHED):
+    import matplotlib.pyplot as plt
+
+    result = analyses.get(
+        "approx_patterns",
+        [pattern_length, counters, len(taken)],
+        lambda: approx_pattern_counts(taken, pattern_length, counters),
+    )
+    codes, counts, errors = result["codes"], result["counts"], result["errors"]
+    patterns = [to_pattern(code, pattern_length) for code in codes.tolist()]
+
+    print(f"\nApproximate {pattern_length}-bit patterns ({counters} counters):")
+    for pattern, count, error in zip(patterns, counts.tolist(), errors.tolist()):
+        print(f"{pattern} {count - error:>10} - {count:<10}")
+    print(f"Patterns not listed occur at most {int(result['floor'])} times")
+
+    plt.figure(figsize=(15, 8))
+    plt.bar(range(len(counts)), counts, yerr=[errors, np.zeros_like(errors)])
+    plt.title(f"Most Common {pattern_length}-bit Patterns (Space-Saving estimate)")
+    plt.xlabel("Pattern")
+    plt.ylabel("Frequency (upper bound, error bar to lower bound)")
+    plt.xticks(range(len(patterns)), patterns, rotation=45, ha="right", fontsize=7)
+    plt.tight_layout()
+
+
+class RotationClasses:
+    """NGramCounts.rotation_classes() results for a range of lengths"""
+
+    def __init__(self, arrays, min_length, max_length):
+        self.arrays = arrays
+        self.min_length = min_length
+        self.max_length = max_length
+
+    def lengths(self):
+        return range(self.min_length, self.max_length + 1)
+
+    def rotation_classes(self, length):
+        return self.arrays[f"codes{length}"], self.arrays[f"counts{length}"]
 
-    # Convert to DataFrame for plotting
-    df = pd.DataFrame.from_dict(pattern_groups, orient="index")
-    df = df.sort_values("count", ascending=False).head(10)
+
+def rotation_counts(taken, min_length, max_length, legacy=False, analyses=UNCACHED):
+    """Rotation classes of every length in a range, from one NGramCounts"""
+
+    def compute():
+        ngrams = NGramCounts(taken, min_length, max_length, legacy)
+        arrays = {}
+        for length in ngrams.lengths():
+            codes, counts = ngrams.rotation_classes(length)
+            arrays[f"codes{length}"], arrays[f"counts{length}"] = codes, counts
+        return arrays
+
+    params = [min_length, max_length, legacy, len(taken)]
+    arrays = analyses.get("rotations", params, compute)
+    return RotationClasses(arrays, min_length, max_length)
+
+
+def analyze_patterns_with_rotations(ngrams, pattern_length=8):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
+    # Count patterns including rotations
+    codes, counts = ngrams.rotation_classes(pattern_length)
+    patterns = [to_pattern(code, pattern_length) for code in codes[:10]]
+    df = pd.DataFrame(
+        {"count": counts[:10], "rotations": [list(rotations(p)) for p in patterns]},
+        index=patterns,
+    )
 
     # Create visualization
     plt.figure(figsize=(15, 10))
@@ -118,38 +354,20 @@ def analyze_patterns_with_rotations(branch_history, pattern_length=8):
     plt.tight_layout()
 
 
-def analyze_pattern_lengths(branch_history, min_length=4, max_length=16):
-    history = [1 if list(inst.values())[0] else 0 for inst in branch_history]
-    history_str = "".join(map(str, history))
-
-    def get_rotations(pattern):
-        rotations = set()
-        for i in range(len(pattern)):
-            rotations.add(pattern[i:] + pattern[:i])
-        return rotations
+def analyze_pattern_lengths(ngrams, min_length=4, max_length=16):
+    import matplotlib.pyplot as plt
 
     # Collect stats for each pattern length
     length_stats = {}
     for pattern_length in range(min_length, max_length + 1):
-        pattern_groups = {}
-        seen_patterns = set()
-
-        for i in range(len(history_str) - pattern_length):
-            pattern = history_str[i : i + pattern_length]
-            if pattern not in seen_patterns:
-                rotations = get_rotations(pattern)
-                total_count = 0
-                for rot in rotations:
-                    total_count += history_str.count(rot)
-                    seen_patterns.add(rot)
-                pattern_groups[pattern] = total_count
+        _, counts = ngrams.rotation_classes(pattern_length)
 
         # Get statistics for this length
-        if pattern_groups:
-            top_counts = sorted(pattern_groups.values(), reverse=True)
+        if len(counts):
+            top_counts = counts.tolist()
             length_stats[pattern_length] = {
-                "max_count": max(pattern_groups.values()),
-                "unique_patterns": len(pattern_groups),
+                "max_count": top_counts[0],
+                "unique_patterns": len(top_counts),
                 "top_3_counts": top_counts[:3],
                 "count_distribution": top_counts,
             }
@@ -212,62 +430,31 @@ def analyze_pattern_lengths(branch_history, min_length=4, max_length=16):
         print(f"Top 3 frequencies: {stats['top_3_counts']}")
 
 
-import math
-from collections import Counter
-
-
-def get_rotations(pattern):
-    rotations = set()
-    for i in range(len(pattern)):
-        rotations.add(pattern[i:] + pattern[:i])
-    return rotations
-
-
 def calculate_gini(values):
-    values = sorted(values)
+    values = np.sort(np.asarray(values, dtype=np.float64))
     n = len(values)
-    mean = sum(values) / n
-    abs_diff_sum = sum(
-        abs(xi - xj) for i, xi in enumerate(values) for j, xj in enumerate(values)
-    )
-    gini = abs_diff_sum / (2 * n * n * mean)
+    # sum of |xi - xj| over all pairs, from the sorted values
+    abs_diff_sum = 2 * np.sum((2 * np.arange(1, n + 1) - n - 1) * values)
+    gini = abs_diff_sum / (2 * n * n * values.mean())
     return gini
 
 
 def calculate_entropy(values):
-    total = sum(values)
-    frequencies = [count / total for count in values]
-    return -sum(p * math.log2(p) for p in frequencies)
-
+    values = np.asarray(values, dtype=np.float64)
+    frequencies = values / values.sum()
+    return -np.sum(frequencies * np.log2(frequencies))
 
-def calculate_metrics(branch_history, min_length=4, max_length=10):
-    # Convert to bit string
-    history = [1 if list(inst.values())[0] else 0 for inst in branch_history]
-    history_str = "".join(map(str, history))
 
+def calculate_metrics(ngrams, min_length=4, max_length=10):
     results = {}
     for length in range(min_length, max_length + 1):
         # Count patterns (unique up to rotation)
-        pattern_counts = {}
-        seen_patterns = set()
-
-        for i in range(len(history_str) - length):
-            pattern = history_str[i : i + length]
-            if pattern not in seen_patterns:
-                rotations = get_rotations(pattern)
-                count = 0
-                for rot in rotations:
-                    count += history_str.count(rot)
-                    seen_patterns.add(rot)
-                pattern_counts[pattern] = count
-
-        # Get values for calculations
-        values = list(pattern_counts.values())
+        _, values = ngrams.rotation_classes(length)
 
         results[length] = {
             "entropy": calculate_entropy(values),
             "gini": calculate_gini(values),
-            "unique_patterns": len(pattern_counts),
+            "unique_patterns": len(values),
         }
 
     # Print results
@@ -280,33 +467,21 @@ def calculate_metrics(branch_history, min_length=4, max_length=10):
         )
 
 
-def plot_pattern_frequency_heatmap(branch_history, min_length=4, max_length=10):
+def plot_pattern_frequency_heatmap(ngrams, min_length=4, max_length=10):
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
     # Get max patterns across all lengths for y-axis
     max_patterns = 0
     pattern_frequencies = {}
 
     # Collect frequencies for each length
     for length in range(min_length, max_length + 1):
-        pattern_counts = {}
-        seen_patterns = set()
-        history = [1 if list(inst.values())[0] else 0 for inst in branch_history]
-        history_str = "".join(map(str, history))
-
-        for i in range(len(history_str) - length):
-            pattern = history_str[i : i + length]
-            if pattern not in seen_patterns:
-                rotations = get_rotations(pattern)
-                count = 0
-                for rot in rotations:
-                    count += history_str.count(rot)
-                    seen_patterns.add(rot)
-                pattern_counts[pattern] = count
-
-        # Sort by frequency and normalize
-        total = sum(pattern_counts.values())
-        frequencies = sorted(
-            [count / total for count in pattern_counts.values()], reverse=True
-        )
+        _, counts = ngrams.rotation_classes(length)
+
+        # Sorted by frequency, normalize
+        frequencies = counts / counts.sum()
         pattern_frequencies[length] = frequencies
         max_patterns = max(max_patterns, len(frequencies))
 
@@ -334,6 +509,74 @@ def plot_pattern_frequency_heatmap(branch_history, min_length=4, max_length=10):
     plt.colorbar(heatmap.collections[0], label="Frequency (log scale)")
 
 
+def rotation_lengths(args):
+    """(min, max, legacy) of the counting pass behind the rotation figures"""
+    return min(4, args.pattern), max(10, min(args.pattern, 16)), args.legacy_counts
+
+
+def draw_figure(name, pcs, taken, offset, args, analyses):
+    """Draw one of main()'s figures for the branches starting at offset"""
+    if name == "heatmap":
+        create_history_heatmap(taken, args.window, offset=offset, analyses=analyses)
+    elif name == "timeline":
+        plot_branch_timeline(pcs, taken, offset=offset, analyses=analyses)
+    elif name == "phases":
+        plot_phases(pcs, taken, args.phase_window, analyses)
+    elif name == "patterns":
+        analyze_patterns(taken, args.pattern, args.approx, analyses)
+    elif name == "patterns_with_rotations":
+        ngrams = analyses.rotations(taken, *rotation_lengths(args))
+        analyze_patterns_with_rotations(ngrams, args.pattern)
+    elif name == "pattern_lengths":
+        ngrams = analyses.rotations(taken, *rotation_lengths(args))
+        analyze_pattern_lengths(ngrams, min_length=4, max_length=10)
+    else:
+        raise ValueError(f"Unknown figure: {name}")
+
+
+def render(pcs, taken, figure, args, analyses):
+    """Draw and save a (name, start, end, path) figure, returning what it
+    printed"""
+    import matplotlib.pyplot as plt
+
+    name, start, end, path = figure
+    text = io.StringIO()
+    with contextlib.redirect_stdout(text):
+        draw_figure(name, pcs[start:end], taken[start:end], start, args, analyses)
+        plt.savefig(path)
+    plt.close("all")
+    return text.getvalue()
+
+
+def _render_worker(spec, figure, args, analyses):
+    shm, arrays = attach_arrays(spec)
+    text = render(arrays["pcs"], arrays["taken"], figure, args, analyses)
+
+    # views into the block must be gone before it can be closed
+    del arrays
+    shm.close()
+    return text
+
+
+def render_all(pcs, taken, figures, args, analyses, jobs=1):
+    """Render figures over jobs processes sharing one copy of the trace,
+    returning each one's printed output in order"""
+    if jobs <= 1:
+        return [render(pcs, taken, figure, args, analyses) for figure in figures]
+
+    shm, spec = share_arrays(pcs=pcs, taken=taken)
+    try:
+        with ProcessPoolExecutor(jobs) as pool:
+            futures = [
+                pool.submit(_render_worker, spec, figure, args, analyses)
+                for figure in figures
+            ]
+            return [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Branch History Visualizer")
     parser.add_argument("branch_data", help="Path to the branch trace file")
@@ -346,43 +589,89 @@ def main():
         default=8,
         help="Pattern length for analysis (default: 8)",
     )
+    parser.add_argument(
+        "--approx",
+        type=int,
+        nargs="?",
+        const=4096,
+        metavar="COUNTERS",
+        help="Estimate --pattern counts in fixed memory (lengths up to 64, "
+        "default 4096 counters)",
+    )
+    parser.add_argument(
+        "--phase-window",
+        type=int,
+        default=1 << 16,
+        help="Branches per phase detection window (default: 65536)",
+    )
+    parser.add_argument(
+        "--tiles",
+        type=int,
+        default=1,
+        help="Split the heatmap and timeline into this many numbered images",
+    )
+    parser.add_argument(
+        "--legacy-counts",
+        action="store_true",
+        help="Count patterns without overlaps, like the old str.count loops",
+    )
     parser.add_argument(
         "--output",
         type=str,
         default="branch_visualization",
         help="Output prefix for saved plots",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Processes drawing figures in parallel (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every analysis instead of using the on-disk cache",
+    )
 
     args = parser.parse_args()
+    if not 1 <= args.pattern <= 64:
+        parser.error("--pattern must be between 1 and 64")
 
     # Load branch data
-    with open(args.branch_data, "r") as f:
-        branch_data = json.load(f)
+    metadata, pcs, taken = read_arrays(args.branch_data)
 
-    binary = branch_data["binary"]
-    arguments = branch_data.get("arguments", "")
-    branch_history = branch_data["branch_history"]
+    binary = metadata["binary"]
+    arguments = metadata.get("arguments", "")
 
     print("================================")
     print(f"Analyzing: {binary} {arguments}")
-    print(f"Total branches: {len(branch_history)}")
+    print(f"Total branches: {len(taken)}")
     print("--------------------------------")
 
     # Create visualizations
-    create_history_heatmap(branch_history, args.window)
-    plt.savefig(f"{args.output}_heatmap.png")
-
-    plot_branch_timeline(branch_history)
-    plt.savefig(f"{args.output}_timeline.png")
-
-    analyze_patterns(branch_history, args.pattern)
-    plt.savefig(f"{args.output}_patterns.png")
-
-    analyze_patterns_with_rotations(branch_history, args.pattern)
-    plt.savefig(f"{args.output}_patterns_with_rotations.png")
-
-    analyze_pattern_lengths(branch_history, min_length=4, max_length=10)
-    plt.savefig(f"{args.output}_pattern_lengths.png")
+    figures = []
+    for i, (start, end) in enumerate(tiles(len(taken), args.tiles, args.window)):
+        suffix = f"_{i}" if args.tiles > 1 else ""
+        figures.append(("heatmap", start, end, f"{args.output}_heatmap{suffix}.png"))
+        figures.append(("timeline", start, end, f"{args.output}_timeline{suffix}.png"))
+
+    names = ["phases", "patterns", "patterns_with_rotations", "pattern_lengths"]
+    if args.pattern > 16:
+        print(f"Skipping rotation classes of {args.pattern}-bit patterns (over 16)")
+        names.remove("patterns_with_rotations")
+    for name in names:
+        figures.append((name, 0, len(taken), f"{args.output}_{name}.png"))
+
+    analyses = Analyses()
+    if not args.no_cache:
+        analyses = Analyses(Cache(), file_hash(args.branch_data))
+
+    # one exact counting pass serves every rotation figure, up to 16 bits
+    analyses.rotations(taken, *rotation_lengths(args))
+
+    jobs = min(args.jobs, len(figures))
+    for text in render_all(pcs, taken, figures, args, analyses, jobs):
+        print(text, end="")
 
     print(f"Visualizations saved with prefix: {args.output}")
 
@@ -1,34 +1,26 @@
 import sys
-import xml.etree.ElementTree as ET
+import argparse
 
+from trace_parser import RowReader, MispredictionSeries, parse_counts
 
-def parse_pmc_events(xml_file):
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
 
+def parse_pmc_events(xml_file, series=None):
     # Initialize counters
     total_mispredictions = 0
     total_branches = 0
 
-    # Find all pmc-events elements
-    for pmc_event in root.findall(".//pmc-events"):
-        if not pmc_event.text:
+    # Stream the rows, resolving <pmc-events ref="..."/> repeats of earlier values
+    for row in RowReader(xml_file):
+        counts = parse_counts(row.get("pmc-events"))
+        if counts is None:
             continue
 
-        # Split the text into two numbers
-        values = pmc_event.text.strip().split()
-        if len(values) != 2:
-            continue
-
-        try:
-            mispredictions = int(values[0])
-            branches = int(values[1])
-
-            # Add to running totals
-            total_mispredictions += mispredictions
-            total_branches += branches
-        except ValueError:
-            continue
+        # Add to running totals
+        mispredictions, branches = counts
+        total_mispredictions += mispredictions
+        total_branches += branches
+        if series is not None:
+            series.add(row, counts)
 
     # Calculate branch prediction accuracy
     accuracy = (
@@ -43,12 +35,31 @@ def parse_pmc_events(xml_file):
 
 
 def main():
-    file = sys.argv[1] if len(sys.argv) > 1 else "summary.xml"
-    results = parse_pmc_events(file)
+    parser = argparse.ArgumentParser(description="Branch accuracy from PMC counters")
+    parser.add_argument("file", nargs="?", default="summary.xml")
+    parser.add_argument(
+        "--series", help="Write mispredictions per sample-time window to a CSV"
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=10.0,
+        help="Series window in milliseconds (default: 10)",
+    )
+    args = parser.parse_args()
+
+    series = MispredictionSeries(int(args.window * 1e6)) if args.series else None
+    results = parse_pmc_events(args.file, series)
 
     print(f"Total Mispredicted Branches: {results['total_mispredictions']:,}")
     print(f"Total Branches: {results['total_branches']:,}")
     print(f"Branch Prediction Accuracy: {results['accuracy']:.2f}%")
+    if series is not None:
+        series.write(args.series)
+        print(
+            f"Windows: {len(series.branches):,} written to {args.series}",
+            file=sys.stderr,
+        )
 
 
 if __name__ == "__main__":
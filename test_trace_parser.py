@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import tracemalloc
+from collections import Counter
+
+from trace_parser import (
+    MispredictionSeries,
+    RowReader,
+    parse_xctrace_backtraces_global,
+)
+
+STACKS = 50
+
+
+def write_export(path, rows):
+    """An xctrace-like export: unique sample times and counter values per
+    row, a thread and STACKS backtraces that are defined once and then
+    referenced"""
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0"?>\n<trace-query-result>\n<node>\n')
+        f.write('<binary id="b0" name="libx.dylib"/>\n')
+        for i in range(rows):
+            stack = i % STACKS
+            if i < STACKS:
+                backtrace = (
+                    f'<backtrace id="s{stack}"><frame id="f{stack}" name="f{stack}">'
+                    f'<binary ref="b0"/></frame></backtrace>'
+                )
+            else:
+                backtrace = f'<backtrace ref="s{stack}"/>'
+            thread = '<thread id="t0">main</thread>' if i == 0 else '<thread ref="t0"/>'
+            f.write(
+                f'<row><sample-time id="t{i}a">{i * 1000}</sample-time>{thread}'
+                f'<pmc-events id="p{i}">{i % 3} 10</pmc-events>{backtrace}</row>\n'
+            )
+        f.write("</node>\n</trace-query-result>\n")
+
+
+def parse_peak(path):
+    """(peak traced bytes, stacks, series) of parsing an export"""
+    stacks, series = Counter(), MispredictionSeries(1 << 60)
+    tracemalloc.start()
+    parse_xctrace_backtraces_global(path, stacks, series, show=False)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, stacks, series
+
+
+def test_memory_is_bounded_by_distinct_stacks(tmp_path):
+    small, large = str(tmp_path / "small.xml"), str(tmp_path / "large.xml")
+    write_export(small, 10000)
+    write_export(large, 80000)
+
+    small_peak, _, _ = parse_peak(small)
+    large_peak, stacks, series = parse_peak(large)
+    assert large_peak < 2 * small_peak
+
+    assert len(stacks) == STACKS
+    assert sum(stacks.values()) == 80000
+    assert stacks[(("f7", "libx.dylib"),)] == 80000 // STACKS
+    assert sum(series.branches.values()) == 80000 * 10
+    assert sum(series.mispredictions.values()) == sum(i % 3 for i in range(80000))
+
+
+def test_recent_refs_resolve(tmp_path):
+    path = str(tmp_path / "export.xml")
+    write_export(path, 100)
+    reader = RowReader(path, recent_values=4)
+    rows = list(reader)
+    assert all(row["thread"] == "main" for row in rows)
+    assert len(reader.recent) == 4
+    assert set(reader.values) == {
+        "b0",
+        *(f"s{i}" for i in range(STACKS)),
+        *(f"f{i}" for i in range(STACKS)),
+    }
@@ -1,53 +1,200 @@
 #!/usr/bin/env python3
+import sys
+import csv
+import argparse
 import xml.etree.ElementTree as ET
+from collections import Counter, OrderedDict
 
-def parse_xctrace_backtraces_global(xml_file):
+# values referenced from anywhere later in the document, kept for good;
+# their number grows with the profiled code, not with the samples
+SHARED_TAGS = {"binary", "frame", "backtrace"}
+
+# ids of any other tag (sample times, threads, counter values) are only
+# remembered for the most recently used ones
+RECENT_VALUES = 1 << 14
+
+
+class RowReader:
+    """
+    Stream the <row> elements of an xctrace-exported XML with iterparse.
+
+    xctrace writes each distinct value once, as <tag id="...">, and refers
+    back to it with <tag ref="..."/> anywhere later in the document, so
+    ids are recorded as elements end and refs are resolved against them
+    right away. Every <row> is cleared and detached from its parent once it
+    has been yielded. Ids of SHARED_TAGS are kept for the whole document,
+    others only among the RECENT_VALUES last used, so memory is bounded by
+    the distinct frames and stacks rather than the number of rows.
+
+    Values are interned names for <binary>, (function, library) pairs for
+    <frame>, tuples of frames for <backtrace> and the text of anything else.
+    """
+
+    def __init__(self, xml_file, recent_values=RECENT_VALUES):
+        self.xml_file = xml_file
+        self.values = {}
+        self.recent = OrderedDict()
+        self.recent_values = recent_values
+
+    def value(self, elem, children):
+        if elem.tag == "binary":
+            return sys.intern(elem.get("name", "unknown_lib"))
+        if elem.tag == "frame":
+            binary = dict(children).get("binary", "unknown_lib")
+            return (sys.intern(elem.get("name", "unknown_function")), binary)
+        if elem.tag == "backtrace":
+            return tuple(value for tag, value in children if tag == "frame")
+        return elem.text.strip() if elem.text else None
+
+    def resolve(self, elem, children):
+        ref = elem.get("ref")
+        if ref is not None:
+            if ref in self.values:
+                return self.values[ref]
+            if ref in self.recent:
+                self.recent.move_to_end(ref)
+                return self.recent[ref]
+            return f"missing_global_ref_{ref}"
+
+        value = self.value(elem, children)
+        key = elem.get("id")
+        if key is None:
+            return value
+        if elem.tag in SHARED_TAGS:
+            self.values[key] = value
+        else:
+            self.recent[key] = value
+            if len(self.recent) > self.recent_values:
+                self.recent.popitem(last=False)
+        return value
+
+    def __iter__(self):
+        """Yield a {tag: value} dict of the resolved children of each <row>"""
+        parents = []
+        children = [[]]
+        for event, elem in ET.iterparse(self.xml_file, events=("start", "end")):
+            if event == "start":
+                parents.append(elem)
+                children.append([])
+                continue
+
+            parents.pop()
+            resolved = children.pop()
+            if elem.tag == "row":
+                yield dict(resolved)
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+            elif parents:
+                children[-1].append((elem.tag, self.resolve(elem, resolved)))
+
+
+def folded(stack):
+    """Root-first "lib`function;..." line of a leaf-first backtrace"""
+    return ";".join(f"{lib}`{func}" for func, lib in reversed(stack))
+
+
+def write_folded(stacks, output):
+    """Folded stack counts, the input format of flamegraph.pl"""
+    with open(output, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{folded(stack)} {count}\n")
+
+
+def parse_counts(text):
+    """(mispredictions, branches) from a <pmc-events> value, else None"""
+    values = text.split() if text else []
+    if len(values) != 2:
+        return None
+    try:
+        return int(values[0]), int(values[1])
+    except ValueError:
+        return None
+
+
+class MispredictionSeries:
+    """Mispredictions and branches per window of sample time"""
+
+    def __init__(self, window_ns):
+        self.window_ns = window_ns
+        self.mispredictions = Counter()
+        self.branches = Counter()
+
+    def add(self, row, counts):
+        time = row.get("sample-time")
+        if time is None or not time.isdigit():
+            return
+        window = int(time) // self.window_ns
+        self.mispredictions[window] += counts[0]
+        self.branches[window] += counts[1]
+
+    def write(self, output):
+        with open(output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["start_ns", "branches", "mispredictions", "accuracy"])
+            for window in sorted(self.branches):
+                branches = self.branches[window]
+                missed = self.mispredictions[window]
+                accuracy = 1 - missed / branches if branches else 0
+                writer.writerow(
+                    [window * self.window_ns, branches, missed, f"{accuracy:.6f}"]
+                )
+
+
+def parse_xctrace_backtraces_global(xml_file, stacks=None, series=None, show=True):
     """
     Parse an xctrace-exported XML for <backtrace> data,
     collecting frame function (symbol) and library name.
-    
-    Unlike the row-by-row approach, this script collects ALL <binary id="...">
-    elements globally, so <binary ref="xyz"/> references are resolved properly.
+
+    <binary ref="xyz"/> references are resolved against every
+    <binary id="..."> seen so far in the document, in the same pass.
+    Backtraces are counted into the stacks Counter and <pmc-events> added
+    to the series if given.
     """
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-
-    # 1) Build a global dictionary of all <binary id="..."> in the entire doc.
-    #    This covers the case where a row references a binary from a different row or table.
-    global_bin_by_id = {}
-    for binary_elem in root.findall(".//binary[@id]"):
-        bin_id = binary_elem.get("id")
-        global_bin_by_id[bin_id] = binary_elem
-
-    # 2) Iterate all <row> nodes and look for <backtrace> inside them.
-    all_rows = root.findall(".//row")
-    for row in all_rows:
-        backtrace = row.find("backtrace")
-        if backtrace is None:
+    for row in RowReader(xml_file):
+        if series is not None:
+            counts = parse_counts(row.get("pmc-events"))
+            if counts is not None:
+                series.add(row, counts)
+
+        backtrace = row.get("backtrace")
+        if not backtrace:
             continue  # skip rows with no backtrace
+        if isinstance(backtrace, str):
+            backtrace = ((backtrace, "unknown_lib"),)
+        if stacks is not None:
+            stacks[backtrace] += 1
+        if show:
+            for func_name, lib_name in backtrace:
+                print(f"Function: {func_name}, Library: {lib_name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream xctrace backtraces")
+    parser.add_argument("xml_file", nargs="?", default="full_export.xml")
+    parser.add_argument(
+        "--folded", help="Write folded stack counts here instead of printing frames"
+    )
+    parser.add_argument(
+        "--series", help="Also write a windowed misprediction CSV from <pmc-events>"
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=10.0,
+        help="Series window in milliseconds of sample time (default: 10)",
+    )
+    args = parser.parse_args()
+
+    stacks = Counter() if args.folded else None
+    series = MispredictionSeries(int(args.window * 1e6)) if args.series else None
+    parse_xctrace_backtraces_global(args.xml_file, stacks, series, show=not args.folded)
+    if args.folded:
+        write_folded(stacks, args.folded)
+        print(f"{len(stacks):,} distinct stacks, {sum(stacks.values()):,} samples")
+    if args.series:
+        series.write(args.series)
 
-        frames = backtrace.findall("frame")
-        for frame_elem in frames:
-            func_name = frame_elem.get("name", "unknown_function")
-
-            # The <frame> might contain <binary> inline or ref'd
-            binary_elem = frame_elem.find("binary")
-            lib_name = "unknown_lib"
-            if binary_elem is not None:
-                # If <binary ref="XYZ">, we look up globally
-                ref_id = binary_elem.get("ref")
-                if ref_id:
-                    real_bin_elem = global_bin_by_id.get(ref_id)
-                    if real_bin_elem is not None:
-                        lib_name = real_bin_elem.get("name", "unknown_lib")
-                    else:
-                        lib_name = f"missing_global_ref_{ref_id}"
-                else:
-                    # e.g. <binary id="300" name="libsystem_c.dylib" />
-                    lib_name = binary_elem.get("name", "unknown_lib")
-
-            print(f"Function: {func_name}, Library: {lib_name}")
 
 if __name__ == "__main__":
-    XML_FILE = "full_export.xml"  # Adjust path
-    parse_xctrace_backtraces_global(XML_FILE)
+    main()